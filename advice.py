@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+交易建议参数与评分
+阈值和权重集中在参数对象中；评分器按规则表对多只股票（或多根K线）的指标数组一次性计算
+得分、建议代码、指标使用位掩码和预测准确性，建议文字只在界面显示时才格式化
+"""
+
+import json
+import os
+from dataclasses import dataclass, asdict, fields
+from enum import IntEnum
+import numpy as np
+import pandas as pd
+
+from atomic_file import atomic_write_json
+from benchmark import relative_strength_series
+
+
+@dataclass
+class AdviceParams:
+    """交易建议的阈值和权重"""
+    # 涨跌幅
+    change_strong: float = 5.0
+    change_weak: float = 2.0
+    change_strong_score: float = 3.0
+    change_weak_score: float = 1.0
+    # RSI
+    rsi_overbought: float = 70.0
+    rsi_high: float = 60.0
+    rsi_low: float = 40.0
+    rsi_oversold: float = 30.0
+    rsi_strong_score: float = 2.5
+    rsi_weak_score: float = 1.0
+    # 均线
+    ma_aligned_score: float = 2.0
+    ma_cross_score: float = 1.0
+    # MACD
+    macd_score: float = 1.5
+    # 成交量
+    volume_high: float = 1.5
+    volume_low: float = 0.7
+    volume_up_score: float = 1.0
+    volume_down_score: float = 0.5
+    volume_shrink_score: float = 0.5
+    # 价格趋势
+    trend_threshold: float = 5.0
+    trend_score: float = 1.0
+    # 相对强弱（回看期内相对基准指数、行业指数的超额涨幅，%）
+    rs_lookback: float = 20.0
+    rs_threshold: float = 5.0
+    rs_score: float = 1.0
+    rs_industry_score: float = 0.5
+    # 综合得分分档（对称使用：>=strong_buy强烈买入 ... <-strong_buy强烈卖出）
+    strong_buy: float = 4.0
+    buy: float = 2.0
+    weak_buy: float = 0.5
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        """从字典创建参数，忽略未知字段"""
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: float(v) for k, v in data.items() if k in names})
+
+    @classmethod
+    def load(cls, path="advice_params.json"):
+        """从JSON文件加载参数，文件不存在或损坏时使用默认参数"""
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return cls.from_dict(json.load(f))
+            except Exception as e:
+                print(f"加载建议参数失败，使用默认参数: {str(e)}")
+        return cls()
+
+    def save(self, path="advice_params.json"):
+        atomic_write_json(path, self.to_dict())
+
+
+class AdviceCode(IntEnum):
+    """建议代码（-3~3 为由卖到买的强度）"""
+    STRONG_SELL = -3
+    SELL = -2
+    CAUTIOUS_HOLD = -1
+    HOLD = 0
+    CONSIDER_BUY = 1
+    BUY = 2
+    STRONG_BUY = 3
+    WATCH = 4  # 无涨跌幅数据
+    NO_DATA = 5  # 无价格数据
+    FETCH_FAILED = 6  # 数据获取失败
+    BAD_DATA = 7  # 历史数据未通过质量检查
+
+
+ADVICE_LABELS = {
+    AdviceCode.STRONG_SELL: "强烈建议卖出",
+    AdviceCode.SELL: "建议卖出",
+    AdviceCode.CAUTIOUS_HOLD: "谨慎持有",
+    AdviceCode.HOLD: "继续持有",
+    AdviceCode.CONSIDER_BUY: "可以考虑买入",
+    AdviceCode.BUY: "建议买入",
+    AdviceCode.STRONG_BUY: "强烈建议买入",
+    AdviceCode.WATCH: "继续观望",
+    AdviceCode.NO_DATA: "数据不足",
+    AdviceCode.FETCH_FAILED: "数据获取失败",
+    AdviceCode.BAD_DATA: "数据异常",
+}
+
+# 评分用到的指标数组
+INDICATOR_KEYS = ['price', 'change_pct', 'rsi', 'ma5', 'ma20', 'macd', 'macd_signal', 'volume_ratio', 'price_trend',
+                  'rs', 'rs_industry']
+
+# 指标使用位掩码
+IND_RSI = 1
+IND_MA = 2
+IND_MACD = 4
+IND_VOLUME = 8
+IND_TREND = 16
+IND_RS = 32
+IND_RS_INDUSTRY = 64
+
+
+def _score_rsi(ind, p):
+    rsi = ind['rsi']
+    return np.select(
+        [rsi > p.rsi_overbought, rsi > p.rsi_high, rsi < p.rsi_oversold, rsi < p.rsi_low],
+        [-p.rsi_strong_score, -p.rsi_weak_score, p.rsi_strong_score, p.rsi_weak_score], 0.0)
+
+
+def _score_ma(ind, p):
+    price, ma5, ma20 = ind['price'], ind['ma5'], ind['ma20']
+    return np.select(
+        [(price > ma5) & (ma5 > ma20), (price < ma5) & (ma5 < ma20), ma5 > ma20],
+        [p.ma_aligned_score, -p.ma_aligned_score, p.ma_cross_score], -p.ma_cross_score)
+
+
+def _score_macd(ind, p):
+    macd, signal = ind['macd'], ind['macd_signal']
+    return np.select([(macd > signal) & (macd > 0), (macd < signal) & (macd < 0)],
+                     [p.macd_score, -p.macd_score], 0.0)
+
+
+def _score_volume(ind, p):
+    vr, change = ind['volume_ratio'], ind['change_pct']
+    return np.select(
+        [(vr > p.volume_high) & (change > 0), vr > p.volume_high, vr < p.volume_low],
+        [p.volume_up_score, -p.volume_down_score, -p.volume_shrink_score], 0.0)
+
+
+def _score_trend(ind, p):
+    trend = ind['price_trend']
+    return np.select([trend > p.trend_threshold, trend < -p.trend_threshold],
+                     [p.trend_score, -p.trend_score], 0.0)
+
+
+def _score_rs(ind, p):
+    rs = ind['rs']
+    return np.select([rs > p.rs_threshold, rs < -p.rs_threshold], [p.rs_score, -p.rs_score], 0.0)
+
+
+def _score_rs_industry(ind, p):
+    rs = ind['rs_industry']
+    return np.select([rs > p.rs_threshold, rs < -p.rs_threshold],
+                     [p.rs_industry_score, -p.rs_industry_score], 0.0)
+
+
+def _vote_from_score(ind, contribution):
+    return np.sign(contribution)
+
+
+def _vote_trend(ind, contribution):
+    return np.sign(ind['price_trend'])
+
+
+# 规则表：(位, 名称, 所需指标, 计分函数, 一致性投票函数)
+# 投票用于预测准确性中的“指标一致性”，成交量不参与投票
+RULES = [
+    (IND_RSI, "RSI", ('rsi',), _score_rsi, _vote_from_score),
+    (IND_MA, "MA", ('ma5', 'ma20'), _score_ma, _vote_from_score),
+    (IND_MACD, "MACD", ('macd', 'macd_signal'), _score_macd, _vote_from_score),
+    (IND_VOLUME, "成交量", ('volume_ratio',), _score_volume, None),
+    (IND_TREND, "趋势", ('price_trend',), _score_trend, _vote_trend),
+    (IND_RS, "相对强弱", ('rs',), _score_rs, _vote_from_score),
+    (IND_RS_INDUSTRY, "行业相对强弱", ('rs_industry',), _score_rs_industry, _vote_from_score),
+]
+
+# 按使用指标数量增加的基础准确性
+_COUNT_BONUS = np.array([0.0, 0.0, 6.0, 12.0, 20.0, 30.0])
+_POPCOUNT = np.array([bin(i).count('1') for i in range(1 << len(RULES))])
+
+
+def score_batch(ind, params):
+    """
+    批量评分
+    ind 为等长数组字典（键见 INDICATOR_KEYS），缺失的指标用 NaN 表示（整个键缺失时跳过该规则），
+    返回(得分, 建议代码, 指标位掩码, 预测准确性)四个数组
+    """
+    p = params
+    price = np.asarray(ind['price'], dtype=float)
+    change = np.asarray(ind['change_pct'], dtype=float)
+    n = len(price)
+
+    # 1. 涨跌幅
+    score = -np.select([change > p.change_strong, change > p.change_weak],
+                       [p.change_strong_score, p.change_weak_score], 0.0)
+    score += np.select([change < -p.change_strong, change < -p.change_weak],
+                       [p.change_strong_score, p.change_weak_score], 0.0)
+
+    # 2. 技术指标规则
+    mask = np.zeros(n, dtype=np.int64)
+    buy_votes = np.zeros(n)
+    sell_votes = np.zeros(n)
+    for bit, _, keys, score_fn, vote_fn in RULES:
+        if any(key not in ind for key in keys):
+            continue
+        available = np.ones(n, dtype=bool)
+        for key in keys:
+            available &= ~np.isnan(ind[key])
+        contribution = np.where(available, score_fn(ind, p), 0.0)
+        score += contribution
+        mask |= np.where(available, bit, 0)
+        if vote_fn is not None:
+            vote = np.where(available, vote_fn(ind, contribution), 0.0)
+            buy_votes += vote > 0
+            sell_votes += vote < 0
+
+    # 3. 建议代码：有指标时按综合得分分档，否则仅按涨跌幅分档
+    score_cuts = np.array([-p.strong_buy, -p.buy, -p.weak_buy, p.weak_buy, p.buy, p.strong_buy])
+    by_score = np.searchsorted(score_cuts, score, side='right') - 3
+    change_cuts = np.array([-p.change_strong, -p.change_weak, p.change_weak, p.change_strong])
+    by_change = 2 - np.searchsorted(change_cuts, change, side='left')
+    codes = np.where(mask > 0, by_score, by_change)
+
+    # 4. 预测准确性：指标数量 + 信号强度 + 指标一致性
+    score_abs = np.abs(score)
+    strength = np.select([score_abs >= p.strong_buy, score_abs >= p.buy, score_abs >= p.weak_buy],
+                         [15.0, 10.0, 5.0], 0.0)
+    total_votes = buy_votes + sell_votes
+    with np.errstate(divide='ignore', invalid='ignore'):
+        consistency = np.where(total_votes > 0, np.maximum(buy_votes, sell_votes) / total_votes * 10.0, 0.0)
+    accuracy = 50.0 + _COUNT_BONUS[np.minimum(_POPCOUNT[mask], 5)] + strength + consistency
+    accuracy = np.where(mask > 0, np.round(np.clip(accuracy, 35.0, 95.0), 2), 35.0)
+
+    # 5. 缺少价格或涨跌幅
+    no_price = np.isnan(price) | (price == 0)
+    no_change = np.isnan(change)
+    codes = np.where(no_change, AdviceCode.WATCH, codes)
+    codes = np.where(no_price, AdviceCode.NO_DATA, codes)
+    accuracy = np.where(no_change, 35.0, accuracy)
+    accuracy = np.where(no_price, 0.0, accuracy)
+    return score, codes.astype(np.int64), mask, accuracy
+
+
+def indicator_arrays(hist_data, benchmark=None, rs_lookback=20):
+    """
+    计算每根K线上的技术指标序列，规则与 StockTrader.calculate_technical_indicators 一致，
+    返回等长数组字典，数据不足处为 NaN；提供基准(日期数组, 收盘价数组)时还包含相对强弱序列 rs
+    """
+    hist_data = hist_data.sort_values('日期')
+    data = pd.DataFrame({
+        'date': hist_data['日期'].astype(str).str[:10],
+        'close': pd.to_numeric(hist_data['收盘'], errors='coerce'),
+        'volume': pd.to_numeric(hist_data['成交量'], errors='coerce'),
+    }).dropna(subset=['close']).reset_index(drop=True)
+    close, volume = data['close'], data['volume']
+    n = len(close)
+    bar = np.arange(n)
+
+    ma5 = close.rolling(5).mean()
+    ma10 = close.rolling(10).mean()
+    ma20 = close.rolling(20).mean()
+
+    delta = close.diff()
+    avg_gain = delta.clip(lower=0).rolling(14, min_periods=13).mean()
+    avg_loss = (-delta).clip(lower=0).rolling(14, min_periods=13).mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(avg_loss.to_numpy() != 0, 100 - 100 / (1 + avg_gain / avg_loss), 100.0)
+    rsi = np.where(bar >= 13, rsi, np.nan)
+
+    macd = (close.rolling(12).mean() - close.rolling(26).mean()).to_numpy()
+
+    vol5 = volume.rolling(5, min_periods=1).mean().to_numpy()
+    vol20 = volume.rolling(20, min_periods=1).mean().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volume_ratio = np.where((bar >= 19) & (vol20 > 0), vol5 / vol20, 1.0)
+        trend20 = ((ma5 - ma20) / ma20 * 100).to_numpy()
+        trend10 = ((ma5 - ma10) / ma10 * 100).to_numpy()
+    volume_ratio = np.where(bar >= 4, volume_ratio, np.nan)
+    price_trend = np.where(bar >= 19, trend20, np.where(bar >= 9, trend10, np.nan))
+
+    arrays = {
+        'date': data['date'].to_numpy(),
+        'price': close.to_numpy(dtype=float),
+        'change_pct': (close.pct_change() * 100).fillna(0.0).to_numpy(),
+        'rsi': rsi.astype(float),
+        'ma5': ma5.to_numpy(),
+        'ma20': ma20.to_numpy(),
+        'macd': macd,
+        'macd_signal': macd * 0.9,
+        'volume_ratio': volume_ratio.astype(float),
+        'price_trend': price_trend.astype(float),
+    }
+    if benchmark is not None:
+        arrays['rs'] = relative_strength_series(arrays['date'], arrays['price'], benchmark, int(rs_lookback))
+    return arrays
+
+
+def indicator_names(mask):
+    """位掩码对应的指标名称列表"""
+    return [name for bit, name, _, _, _ in RULES if mask & bit]
+
+
+def format_advice(code, mask):
+    """格式化建议文字（仅在显示时调用）"""
+    label = ADVICE_LABELS[AdviceCode(code)]
+    if code > AdviceCode.STRONG_BUY:
+        return label
+    if mask == 0:
+        return f"{label} (仅涨跌幅)"
+    return f"{label} ({', '.join(indicator_names(mask))})"
+
+
+def stack_indicators(prices, changes, indicators_list):
+    """把多只股票的价格、涨跌幅和指标字典整理为评分用的数组字典"""
+    ind = {
+        'price': np.array([np.nan if v is None else v for v in prices], dtype=float),
+        'change_pct': np.array([np.nan if v is None else v for v in changes], dtype=float),
+    }
+    for key in INDICATOR_KEYS[2:]:
+        ind[key] = np.array([(item or {}).get(key, np.nan) for item in indicators_list], dtype=float)
+    return ind
+
+
+def screen(codes, ind, params, min_advice=AdviceCode.CONSIDER_BUY, top=None, min_rs=None):
+    """选股：按综合得分降序返回建议不低于 min_advice（且相对强弱不低于 min_rs）的[(代码, 得分, 建议代码)]"""
+    score, advice, _, _ = score_batch(ind, params)
+    selected = (advice >= min_advice) & (advice <= AdviceCode.STRONG_BUY)
+    if min_rs is not None:
+        selected &= np.asarray(ind['rs'], dtype=float) >= min_rs
+    order = np.argsort(-score[selected], kind='stable')
+    codes = np.asarray(codes)[selected][order]
+    result = list(zip(codes.tolist(), score[selected][order].tolist(), advice[selected][order].tolist()))
+    return result[:top] if top else result
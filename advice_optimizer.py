@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+交易建议参数搜索
+对本地缓存的历史数据（history_cache）做网格或随机搜索，按前瞻收益命中率对参数组排序。
+技术指标序列只计算一次，各组参数在多个进程中复用同一份数组并行评估。
+
+用法：
+    python advice_optimizer.py --mode random --trials 2000 --horizon 5
+    python advice_optimizer.py --mode grid --params rsi_overbought rsi_oversold --save
+"""
+
+import argparse
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from advice import AdviceParams, AdviceCode, score_batch, indicator_arrays
+from history_store import HistoryStore
+from benchmark import BenchmarkStore
+from data_quality import validate, quality_names
+from symbol_master import get_exchange_board
+
+# 每个参数的候选值
+SEARCH_SPACE = {
+    'change_strong': [4.0, 5.0, 6.0, 7.0],
+    'change_weak': [1.0, 2.0, 3.0],
+    'rsi_overbought': [65.0, 70.0, 75.0, 80.0],
+    'rsi_high': [55.0, 60.0, 65.0],
+    'rsi_low': [35.0, 40.0, 45.0],
+    'rsi_oversold': [20.0, 25.0, 30.0, 35.0],
+    'rsi_strong_score': [1.5, 2.5, 3.5],
+    'ma_aligned_score': [1.0, 2.0, 3.0],
+    'macd_score': [0.5, 1.5, 2.5],
+    'volume_high': [1.2, 1.5, 2.0],
+    'volume_low': [0.5, 0.7, 0.9],
+    'trend_threshold': [3.0, 5.0, 8.0],
+    'trend_score': [0.5, 1.0, 2.0],
+    'rs_threshold': [3.0, 5.0, 10.0],
+    'rs_score': [0.5, 1.0, 2.0],
+    'strong_buy': [3.0, 4.0, 5.0],
+    'buy': [1.5, 2.0, 3.0],
+    'weak_buy': [0.25, 0.5, 1.0],
+}
+
+# 网格搜索默认只搜索阈值（权重保持默认）
+GRID_PARAMS = ['rsi_overbought', 'rsi_high', 'rsi_low', 'rsi_oversold',
+               'strong_buy', 'buy', 'weak_buy', 'volume_high', 'volume_low', 'trend_threshold']
+
+# 从第26根K线开始评估（MACD需要26条数据）
+MIN_BARS = 26
+
+
+def prepare_arrays(store, codes, horizon, benchmark=None, rs_lookback=20):
+    """为所有股票计算指标序列和前瞻收益，并拼接为一组扁平数组（有基准缓存时包含相对强弱）"""
+    parts = []
+    for code in codes:
+        hist_data = store.load(code)
+        if hist_data is None or len(hist_data) < MIN_BARS + horizon:
+            continue
+        # 整段数据中有严重问题的股票不参与评估
+        report = validate(hist_data, get_exchange_board(code)[1], window=None)
+        if not report.ok:
+            print(f"跳过股票 {code}（{'、'.join(quality_names(report.blocking))}）")
+            continue
+        hist_data = report.clean(hist_data)
+        try:
+            ind = indicator_arrays(hist_data, benchmark, rs_lookback)
+        except Exception as e:
+            print(f"计算股票 {code} 指标序列失败: {str(e)}")
+            continue
+        ind.pop('date')  # 评估不需要日期，避免传给工作进程
+        price = ind['price']
+        forward = np.full(len(price), np.nan)
+        forward[:-horizon] = price[horizon:] / price[:-horizon] - 1
+        ind['forward'] = forward
+        ind['valid'] = (np.arange(len(price)) >= MIN_BARS - 1) & ~np.isnan(forward)
+        parts.append(ind)
+    if not parts:
+        return None
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+
+def evaluate(arrays, params):
+    """评估一组参数：返回(命中率, 信号数, 平均前瞻收益差)"""
+    _, codes, _, _ = score_batch(arrays, params)
+    valid = arrays['valid']
+    forward = arrays['forward']
+    buy = valid & (codes >= AdviceCode.CONSIDER_BUY) & (codes <= AdviceCode.STRONG_BUY)
+    sell = valid & (codes <= AdviceCode.CAUTIOUS_HOLD)
+    signals = int(buy.sum() + sell.sum())
+    if signals == 0:
+        return (0.0, 0, 0.0)
+    hits = int((buy & (forward > 0)).sum() + (sell & (forward < 0)).sum())
+    buy_ret = forward[buy].mean() if buy.any() else 0.0
+    sell_ret = forward[sell].mean() if sell.any() else 0.0
+    return (hits / signals, signals, float(buy_ret - sell_ret) * 100)
+
+
+# 工作进程内共享的指标数组（每个进程只接收一次）
+_worker_arrays = None
+
+
+def _init_worker(arrays):
+    global _worker_arrays
+    _worker_arrays = arrays
+
+
+def _evaluate_trial(param_dict):
+    params = AdviceParams.from_dict(param_dict)
+    return evaluate(_worker_arrays, params) + (param_dict,)
+
+
+def is_consistent(params):
+    """检查阈值顺序是否合理"""
+    p = params
+    return (p.rsi_oversold < p.rsi_low < p.rsi_high < p.rsi_overbought
+            and p.weak_buy < p.buy < p.strong_buy
+            and p.change_weak < p.change_strong
+            and p.volume_low < 1 < p.volume_high)
+
+
+def generate_trials(mode, trials, names, seed=None):
+    """生成待评估的参数组（字典列表）"""
+    base = AdviceParams().to_dict()
+    result = []
+    if mode == 'grid':
+        for values in itertools.product(*(SEARCH_SPACE[name] for name in names)):
+            candidate = dict(base, **dict(zip(names, values)))
+            if is_consistent(AdviceParams.from_dict(candidate)):
+                result.append(candidate)
+        if len(result) > trials:
+            print(f"网格共 {len(result)} 组，随机抽取 {trials} 组评估")
+            result = random.Random(seed).sample(result, trials)
+    else:
+        rng = random.Random(seed)
+        attempts = 0
+        while len(result) < trials and attempts < trials * 100:
+            attempts += 1
+            candidate = dict(base, **{name: rng.choice(SEARCH_SPACE[name]) for name in names})
+            if is_consistent(AdviceParams.from_dict(candidate)):
+                result.append(candidate)
+    # 始终包含当前默认参数作为对照
+    result.insert(0, base)
+    return result
+
+
+def search(arrays, trials, workers=None, min_signals=30):
+    """并行评估所有参数组，按命中率降序返回[(命中率, 信号数, 收益差, 参数字典)]"""
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(trials) // (workers * 8))
+    if workers == 1:
+        _init_worker(arrays)
+        results = [_evaluate_trial(t) for t in trials]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(arrays,)) as pool:
+            results = list(pool.map(_evaluate_trial, trials, chunksize=chunksize))
+    results = [r for r in results if r[1] >= min_signals]
+    results.sort(key=lambda r: (r[0], r[2]), reverse=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="交易建议参数搜索")
+    parser.add_argument('--mode', choices=['grid', 'random'], default='random', help="搜索方式")
+    parser.add_argument('--trials', type=int, default=2000, help="评估的参数组数量上限")
+    parser.add_argument('--horizon', type=int, default=5, help="前瞻收益的交易日数")
+    parser.add_argument('--params', nargs='+', help="参与搜索的参数名（默认：网格为阈值，随机为全部）")
+    parser.add_argument('--workers', type=int, default=None, help="并行进程数（默认CPU核数）")
+    parser.add_argument('--min-signals', type=int, default=30, help="信号数少于此值的参数组不参与排名")
+    parser.add_argument('--top', type=int, default=10, help="显示排名前几的参数组")
+    parser.add_argument('--cache-dir', default="history_cache", help="历史数据缓存目录")
+    parser.add_argument('--benchmark', default="000300", help="计算相对强弱的基准指数代码（使用程序缓存的指数日线）")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子")
+    parser.add_argument('--save', action='store_true', help="把最优参数保存到 advice_params.json")
+    args = parser.parse_args()
+
+    names = args.params or (GRID_PARAMS if args.mode == 'grid' else list(SEARCH_SPACE))
+    unknown = [name for name in names if name not in SEARCH_SPACE]
+    if unknown:
+        parser.error(f"未知参数: {', '.join(unknown)}")
+
+    store = HistoryStore(args.cache_dir)
+    codes = store.codes()
+    print(f"加载 {len(codes)} 只股票的历史缓存...")
+    start = time.time()
+    benchmarks = BenchmarkStore(os.path.join(args.cache_dir, "benchmarks"))
+    benchmark = benchmarks.load(BenchmarkStore.index_key(args.benchmark))
+    if benchmark is None:
+        print(f"没有基准指数 {args.benchmark} 的缓存，不评估相对强弱")
+    arrays = prepare_arrays(store, codes, args.horizon, benchmark, int(AdviceParams().rs_lookback))
+    if arrays is None:
+        print("没有可用的历史数据，请先在程序中更新价格以生成缓存")
+        return
+    print(f"指标序列计算完成，共 {int(arrays['valid'].sum())} 个样本，用时 {time.time() - start:.1f} 秒")
+
+    trials = generate_trials(args.mode, args.trials, names, args.seed)
+    print(f"开始评估 {len(trials)} 组参数...")
+    start = time.time()
+    results = search(arrays, trials, args.workers, args.min_signals)
+    print(f"评估完成，用时 {time.time() - start:.1f} 秒")
+
+    if not results:
+        print("没有信号数足够的参数组")
+        return
+    baseline = evaluate(arrays, AdviceParams())
+    print(f"默认参数: 命中率 {baseline[0] * 100:.2f}%，信号 {baseline[1]} 个，收益差 {baseline[2]:.3f}%")
+    for rank, (hit_rate, signals, spread, param_dict) in enumerate(results[:args.top], 1):
+        changed = {k: v for k, v in param_dict.items() if v != getattr(AdviceParams(), k)}
+        print(f"{rank:>3}. 命中率 {hit_rate * 100:.2f}%  信号 {signals}  收益差 {spread:.3f}%  {changed}")
+
+    if args.save:
+        AdviceParams.from_dict(results[0][3]).save("advice_params.json")
+        print("最优参数已保存到 advice_params.json")
+
+
+if __name__ == "__main__":
+    main()
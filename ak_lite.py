@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+akshare 轻量加载
+akshare/__init__.py 会导入全部数百个接口模块，启动慢、打包体积大。
+这里只按需导入程序实际用到的子模块（不执行 akshare/__init__.py），
+用法与 akshare 相同：import ak_lite as ak; ak.stock_zh_a_spot_em()
+
+子模块导入失败或使用了未登记的函数时，自动回退到完整的 akshare。
+设置环境变量 STOCK_TRADER_FULL_AKSHARE=1 可直接使用完整的 akshare。
+"""
+
+import importlib
+import importlib.util
+import os
+import sys
+import types
+
+# 函数名 -> 所在子模块
+AKSHARE_FUNCTIONS = {
+    'stock_zh_a_spot_em': 'akshare.stock_feature.stock_hist_em',
+    'stock_zh_a_hist': 'akshare.stock_feature.stock_hist_em',
+    'stock_individual_info_em': 'akshare.stock.stock_info_em',
+    'stock_info_sh_name_code': 'akshare.stock.stock_info',
+    'stock_info_sz_name_code': 'akshare.stock.stock_info',
+    'stock_info_bj_name_code': 'akshare.stock.stock_info',
+    'index_zh_a_hist': 'akshare.index.index_zh_em',
+    'stock_board_industry_hist_em': 'akshare.stock.stock_board_industry_em',
+}
+
+# 打包时需要的akshare子模块
+AKSHARE_MODULES = sorted(set(AKSHARE_FUNCTIONS.values()))
+
+_full_akshare = None
+
+
+def _ensure_package():
+    """注册一个不执行 __init__.py 的 akshare 包对象，以便直接导入子模块"""
+    if 'akshare' in sys.modules:
+        return
+    spec = importlib.util.find_spec('akshare')
+    if spec is None or not spec.submodule_search_locations:
+        raise ImportError("未找到 akshare")
+    package = types.ModuleType('akshare')
+    package.__path__ = list(spec.submodule_search_locations)
+    package.__spec__ = spec
+    package.__file__ = spec.origin
+    package.__package__ = 'akshare'
+    package._ak_lite_stub = True
+    sys.modules['akshare'] = package
+
+
+def _load_full():
+    """回退到完整的 akshare（移除轻量包对象后正常导入）"""
+    global _full_akshare
+    if _full_akshare is None:
+        if getattr(sys.modules.get('akshare'), '_ak_lite_stub', False):
+            del sys.modules['akshare']
+        _full_akshare = importlib.import_module('akshare')
+    return _full_akshare
+
+
+def _load(name):
+    if os.environ.get("STOCK_TRADER_FULL_AKSHARE") or name not in AKSHARE_FUNCTIONS:
+        return getattr(_load_full(), name)
+    try:
+        _ensure_package()
+        return getattr(importlib.import_module(AKSHARE_FUNCTIONS[name]), name)
+    except (ImportError, AttributeError) as e:
+        print(f"轻量加载 {name} 失败，改用完整 akshare: {str(e)}")
+        return getattr(_load_full(), name)
+
+
+def __getattr__(name):
+    if name.startswith('__'):
+        raise AttributeError(name)
+    func = _load(name)
+    # 缓存到模块上，之后的访问不再经过 __getattr__
+    globals()[name] = func
+    return func
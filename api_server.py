@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地HTTP/JSON接口
+把自选列表、行情、技术指标和交易建议以JSON形式提供给多个客户端。
+所有请求都从同一份内存快照读取（刷新线程发布快照），不会触发任何上游数据请求；
+响应体在发布快照时预先编码并缓存，支持 ETag / If-None-Match（ETag 为响应内容的摘要，
+只有 /api/snapshot 包含发布序号和时间，其余接口内容不变时 ETag 不变）。
+
+接口：
+    GET /api/snapshot           全部数据
+    GET /api/watchlist          自选列表
+    GET /api/quotes             行情（价格、涨跌幅）
+    GET /api/indicators         技术指标
+    GET /api/advice             交易建议
+    GET /api/stocks/<代码>      单只股票的全部数据
+    GET /api/metrics            上游请求速率和错误计数、最近一次刷新耗时
+    GET /api/risk               各窗口的组合波动率、高相关分组和相关性最高的股票对
+    GET /api/screen             选股结果：建议买入及以上的自选股票按得分降序（可要求最低相对强弱）
+"""
+
+import hashlib
+import json
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+QUOTE_FIELDS = ('name', 'price', 'change_pct', 'update_time')
+ADVICE_FIELDS = ('name', 'score', 'advice', 'advice_text', 'indicators_used', 'accuracy', 'update_time')
+
+
+class SnapshotHub:
+    """共享快照：发布时整体替换，读取无需加锁"""
+
+    def __init__(self, max_age=5):
+        self.max_age = max_age  # 客户端缓存秒数
+        self._lock = threading.Lock()
+        self._version = 0
+        self._published = 0  # 当前缓存对应的发布序号
+        self._state_version = -1  # 当前缓存对应的共享状态版本
+        self._cache = {}  # 路径 -> (etag, 响应体)
+        self.publish({'watchlist': [], 'stocks': {}})
+
+    def publish(self, snapshot, state_version=None):
+        """
+        发布新快照并预编码所有列表类接口的响应
+        state_version 为快照读取的共享状态版本：多个线程同时发布时，编码较慢的旧快照不会覆盖已发布的新快照
+        """
+        with self._lock:
+            self._version += 1
+            version = self._version
+        snapshot = dict(snapshot, version=version, published_at=datetime.now().isoformat(timespec='seconds'))
+        stocks = snapshot['stocks']
+        views = {
+            '/api/snapshot': snapshot,
+            '/api/watchlist': {'watchlist': snapshot['watchlist']},
+            '/api/quotes': {'quotes': {
+                c: {k: s.get(k) for k in QUOTE_FIELDS} for c, s in stocks.items()}},
+            '/api/indicators': {'indicators': {
+                c: s.get('indicators') for c, s in stocks.items()}},
+            '/api/advice': {'advice': {
+                c: {k: s.get(k) for k in ADVICE_FIELDS} for c, s in stocks.items()}},
+            '/api/metrics': {'upstream': snapshot.get('upstream'), 'refresh': snapshot.get('refresh')},
+            '/api/risk': {'risk': snapshot.get('risk')},
+            '/api/screen': {'screen': snapshot.get('screen', [])},
+        }
+        cache = {path: self._encode(body) for path, body in views.items()}
+        for code, stock in stocks.items():
+            cache[f'/api/stocks/{code}'] = self._encode(dict(stock, code=code))
+        with self._lock:
+            # 编码期间已有更新的快照发布时丢弃本次结果
+            if version < self._published or (state_version is not None and state_version < self._state_version):
+                return
+            self._published = version
+            if state_version is not None:
+                self._state_version = state_version
+            # 整体替换字典引用，读取方总是看到完整的一版
+            self._cache = cache
+
+    def _encode(self, body):
+        """编码响应体，ETag 为内容摘要：内容不变的接口在多次发布之间 ETag 不变"""
+        data = json.dumps(body, ensure_ascii=False, allow_nan=False, default=str).encode('utf-8')
+        return (f'"{hashlib.blake2b(data, digest_size=12).hexdigest()}"', data)
+
+    def get(self, path):
+        """返回(etag, 响应体)，路径不存在时返回None"""
+        return self._cache.get(path)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    hub = None  # 由 start_server 设置
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0].rstrip('/')
+        entry = self.hub.get(path)
+        if entry is None:
+            self._send(404, b'{"error": "not found"}')
+            return
+        etag, body = entry
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', f'max-age={self.hub.max_age}')
+            self.end_headers()
+            return
+        self._send(200, body, etag)
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', f'max-age={self.hub.max_age}')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 高并发下不逐条打印访问日志
+        pass
+
+
+def start_server(hub, host="127.0.0.1", port=8765):
+    """在后台线程启动HTTP服务，返回服务器对象"""
+    handler = type('BoundApiHandler', (ApiHandler,), {'hub': hub})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"HTTP接口已启动: http://{host}:{port}/api/snapshot")
+    return server
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+共享状态
+自选列表、每只股票的数据和全市场行情快照放在一个不可变的状态对象中。
+写入方（刷新线程、界面线程）在写锁内基于最新状态复制出新状态，再整体替换引用（写时复制）；
+读取方只需取一次 StateStore.current，不加锁、不阻塞，也不会看到只更新了一半的数据。
+
+约定：状态中的股票数据为只读映射，行情快照DataFrame不可原地修改，需要修改时构造新对象。
+"""
+
+import threading
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+
+EMPTY = MappingProxyType({})
+
+
+def freeze(entry):
+    """把一只股票的数据转换为只读映射"""
+    return entry if isinstance(entry, MappingProxyType) else MappingProxyType(dict(entry))
+
+
+@dataclass(frozen=True)
+class AppState:
+    """某一时刻的完整状态"""
+    watchlist: tuple = ()
+    stocks: MappingProxyType = field(default_factory=lambda: EMPTY)  # 代码 -> 只读的股票数据
+    market: object = None  # 全市场行情快照（stock_zh_a_spot_em）
+    market_time: float = None  # 行情快照获取时间（Unix秒）
+    version: int = 0
+
+
+class StateStore:
+    """持有当前状态；写操作串行执行，读操作无锁"""
+
+    def __init__(self, watchlist=()):
+        self._lock = threading.Lock()
+        self._state = AppState(watchlist=tuple(watchlist))
+
+    @property
+    def current(self):
+        """当前状态（引用赋值是原子的，读到的总是某一版完整状态）"""
+        return self._state
+
+    def update(self, func):
+        """在写锁内用 func(旧状态) 生成新状态并替换，返回替换后的状态"""
+        with self._lock:
+            old = self._state
+            new = func(old)
+            if new is not old:
+                self._state = replace(new, version=old.version + 1)
+            return self._state
+
+    def add_code(self, code):
+        """加入自选列表，已存在时返回False"""
+        added = []
+
+        def apply(state):
+            if code in state.watchlist:
+                return state
+            added.append(code)
+            return replace(state, watchlist=state.watchlist + (code,))
+
+        self.update(apply)
+        return bool(added)
+
+    def remove_code(self, code):
+        """从自选列表删除，同时删除该股票的数据，不存在时返回False"""
+        removed = []
+
+        def apply(state):
+            if code not in state.watchlist:
+                return state
+            removed.append(code)
+            stocks = {c: e for c, e in state.stocks.items() if c != code}
+            return replace(state, watchlist=tuple(c for c in state.watchlist if c != code),
+                           stocks=MappingProxyType(stocks))
+
+        self.update(apply)
+        return bool(removed)
+
+    def put_stocks(self, entries):
+        """合并多只股票的数据；已不在自选列表中的股票（刷新期间被删除）会被忽略"""
+        def apply(state):
+            watchlist = set(state.watchlist)
+            updates = {c: freeze(e) for c, e in entries.items() if c in watchlist}
+            if not updates:
+                return state
+            stocks = dict(state.stocks)
+            stocks.update(updates)
+            return replace(state, stocks=MappingProxyType(stocks))
+
+        return self.update(apply)
+
+    def set_market(self, snapshot, timestamp):
+        """替换全市场行情快照"""
+        return self.update(lambda state: replace(state, market=snapshot, market_time=timestamp))
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+原子文件写入
+先写入同目录下的临时文件并刷新到磁盘，再用 os.replace 整体替换目标文件；
+写入途中程序崩溃或断电时，目标文件要么是旧内容、要么是新内容，不会只写了一半。
+"""
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_open(path, mode='w', encoding='utf-8', newline=None):
+    """以写方式打开临时文件，with 块正常结束后替换 path，出错时删除临时文件、保留原文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        # 保持原文件的权限（mkstemp 创建的文件只有所有者可读写）
+        permissions = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+        os.chmod(tmp_path, permissions)
+        kwargs = {} if 'b' in mode else {'encoding': encoding, 'newline': newline}
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, data, **kwargs):
+    """原子写入JSON文件（默认保留中文、缩进2）"""
+    kwargs.setdefault('ensure_ascii', False)
+    kwargs.setdefault('indent', 2)
+    with atomic_open(path) as f:
+        json.dump(data, f, **kwargs)
+
+
+def atomic_write_csv(frame, path):
+    """原子写入CSV文件（UTF-8，不含索引）"""
+    with atomic_open(path, newline='') as f:
+        frame.to_csv(f, index=False)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准指数与相对强弱
+基准指数（默认沪深300）和行业板块指数的日线缓存在 history_cache/benchmarks/ 下，
+每天最多下载一次（成功下载的日期记录在 fetched.json 中，重启程序后仍然有效）；
+个股所属行业缓存在 industries.json 中，只查询一次。
+
+相对强弱 = 个股在回看期内的涨幅相对同期基准涨幅的超额（%）：
+    (1 + 个股收益) / (1 + 基准收益) - 1
+所有自选股票的收盘价对齐成矩阵后，一次向量化运算得到全部股票的相对强弱。
+基准每天只下载一次，个股和基准的回看期都截止到基准最后一个缓存的交易日，
+不会拿个股盘中的最新涨跌和基准前一日的收盘比较。
+"""
+
+import json
+import os
+import time
+from datetime import date
+import numpy as np
+import pandas as pd
+
+from atomic_file import atomic_write_csv, atomic_write_json
+from risk_matrix import align_closes
+
+# 常用基准指数
+BENCHMARKS = {
+    '000300': "沪深300",
+    '000905': "中证500",
+    '000001': "上证指数",
+    '399006': "创业板指",
+}
+
+
+def series_arrays(data):
+    """把日线DataFrame转换为(日期数组, 收盘价数组)"""
+    dates = data['日期'].astype(str).str[:10].to_numpy().astype('U10')
+    return dates, pd.to_numeric(data['收盘'], errors='coerce').to_numpy(dtype=float)
+
+
+def value_asof(series, dates):
+    """取基准在各日期（含）之前最近一个交易日的收盘价，没有时为NaN"""
+    bench_dates, bench_close = series
+    pos = np.searchsorted(bench_dates, dates, side='right') - 1
+    return np.where(pos >= 0, bench_close[np.maximum(pos, 0)], np.nan)
+
+
+def closes_until(closes, until):
+    """把各股票的收盘价截断到 until 中对应日期（含）为止，until 与 closes 顺序一致，None 表示不截断"""
+    result = {}
+    for (code, (dates, prices)), end in zip(closes.items(), until):
+        if end is not None:
+            count = np.searchsorted(np.asarray(dates).astype('U10'), end, side='right')
+            dates, prices = dates[:count], prices[:count]
+        result[code] = (dates, prices)
+    return result
+
+
+def stock_returns(closes, lookback):
+    """
+    各股票在回看期内的收益率，closes 为 {代码: (日期数组, 收盘价数组)}
+    返回(起始日期, 结束日期, 收益率)三个数组；结束日期为各股票最后一个有收盘价的交易日
+    """
+    # 按全部缓存的收盘价对齐，停牌、未更新的股票也能按自己最后一个交易日回看
+    depth = max([len(d) for d, _ in closes.values()] + [lookback + 1])
+    dates, prices = align_closes(closes, depth)
+    n = prices.shape[1]
+    if len(dates) <= lookback:
+        empty = np.full(n, '', dtype='U10')
+        return empty, empty, np.full(n, np.nan)
+    valid = np.isfinite(prices)
+    last = len(dates) - 1 - np.argmax(valid[::-1], axis=0)
+    first = last - lookback
+    ok = valid.any(axis=0) & (first >= 0)
+    first = np.maximum(first, 0)
+    columns = np.arange(n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = prices[last, columns] / prices[first, columns] - 1
+    returns = np.where(ok, returns, np.nan)
+    return dates[first], dates[last], returns
+
+
+def relative_strength(closes, benchmark, lookback=20, groups=None):
+    """
+    相对强弱（%）。benchmark 为单个基准(日期数组, 收盘价数组)；
+    指定 groups（与 closes 顺序一致的基准名称列表）时 benchmark 为 {名称: 基准}，每只股票对比各自的基准；
+    每只股票的回看期截止到所对比基准的最后一个交易日
+    """
+    if groups is None:
+        last = benchmark[0][-1] if benchmark is not None and len(benchmark[0]) else None
+        until = [last] * len(closes)
+    else:
+        last = {name: series[0][-1] for name, series in benchmark.items() if series is not None and len(series[0])}
+        until = [last.get(name) for name in groups]
+    starts, ends, returns = stock_returns(closes_until(closes, until), lookback)
+    bench_returns = np.full(len(returns), np.nan)
+    if groups is None:
+        if benchmark is not None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                bench_returns = value_asof(benchmark, ends) / value_asof(benchmark, starts) - 1
+    else:
+        groups = np.asarray(groups, dtype=object)
+        for name, series in benchmark.items():
+            members = groups == name
+            if members.any() and series is not None:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    bench_returns[members] = (value_asof(series, ends[members])
+                                              / value_asof(series, starts[members]) - 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return ((1 + returns) / (1 + bench_returns) - 1) * 100
+
+
+def relative_strength_series(dates, close, benchmark, lookback=20):
+    """单只股票每根K线上的相对强弱序列（%），用于历史回测和参数搜索"""
+    close = np.asarray(close, dtype=float)
+    bench = value_asof(benchmark, np.asarray(dates).astype('U10'))
+    rs = np.full(len(close), np.nan)
+    if len(close) > lookback:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rs[lookback:] = ((close[lookback:] / close[:-lookback])
+                             / (bench[lookback:] / bench[:-lookback]) - 1) * 100
+    return rs
+
+
+class BenchmarkStore:
+    """基准指数、行业指数日线和个股行业的本地缓存"""
+
+    def __init__(self, directory="history_cache/benchmarks", retry_interval=3600):
+        self.directory = directory
+        self.retry_interval = retry_interval  # 下载失败后再次尝试的最小间隔（秒）
+        self.industry_path = os.path.join(directory, "industries.json")
+        self.fetched_path = os.path.join(directory, "fetched.json")
+        self._series = {}  # 键 -> (日期数组, 收盘价数组)
+        self._fetched = None  # 键 -> 上次成功下载的日期（YYYY-MM-DD），保存在 fetched.json
+        self._attempted = {}  # 键 -> 本次运行中上次尝试下载的时间
+        self._industries = None
+
+    @staticmethod
+    def index_key(symbol):
+        return f"index_{symbol}"
+
+    @staticmethod
+    def industry_key(name):
+        return f"industry_{name}"
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.csv")
+
+    def load(self, key):
+        """读取缓存的指数日线，不存在时返回None"""
+        if key in self._series:
+            return self._series[key]
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = pd.read_csv(path, dtype={'日期': str}, encoding='utf-8')
+        except Exception as e:
+            print(f"读取基准缓存失败 {path}: {str(e)}")
+            return None
+        if data.empty:
+            return None
+        self._series[key] = series_arrays(data)
+        return self._series[key]
+
+    def _load_fetched(self):
+        if self._fetched is None:
+            self._fetched = {}
+            if os.path.exists(self.fetched_path):
+                try:
+                    with open(self.fetched_path, 'r', encoding='utf-8') as f:
+                        self._fetched = json.load(f)
+                except Exception as e:
+                    print(f"读取基准下载记录失败: {str(e)}")
+        return self._fetched
+
+    def needs_refresh(self, key):
+        """今天还没有成功下载过（失败后间隔 retry_interval 再试）"""
+        if self._load_fetched().get(key) == date.today().isoformat():
+            return False
+        attempted = self._attempted.get(key)
+        return attempted is None or time.time() - attempted > self.retry_interval
+
+    def last_date(self, key):
+        """已缓存的最后交易日（YYYYMMDD）"""
+        series = self.load(key)
+        if series is None or len(series[0]) == 0:
+            return None
+        return series[0][-1].replace('-', '')
+
+    def refresh(self, key, fetch):
+        """
+        需要时调用 fetch(start_date) 下载日线（只需包含日期、收盘列），与缓存合并后保存；
+        下载失败时沿用缓存。返回(日期数组, 收盘价数组)或None
+        """
+        if not self.needs_refresh(key):
+            return self.load(key)
+        self._attempted[key] = time.time()
+        try:
+            new_data = fetch(self.last_date(key) or "20200101")
+        except Exception as e:
+            print(f"获取基准 {key} 日线失败，使用本地缓存: {str(e)}")
+            return self.load(key)
+        self._mark_fetched(key)
+        if new_data is None or new_data.empty:
+            return self.load(key)
+
+        new_data = new_data[['日期', '收盘']].copy()
+        new_data['日期'] = new_data['日期'].astype(str).str[:10]
+        cached = self.load(key)
+        if cached is not None:
+            old = pd.DataFrame({'日期': cached[0], '收盘': cached[1]})
+            new_data = pd.concat([old, new_data], ignore_index=True)
+        merged = new_data.drop_duplicates(subset='日期', keep='last').sort_values('日期').reset_index(drop=True)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            atomic_write_csv(merged, self.path(key))
+        except Exception as e:
+            print(f"缓存基准 {key} 日线失败: {str(e)}")
+        self._series[key] = series_arrays(merged)
+        return self._series[key]
+
+    def _mark_fetched(self, key):
+        """记录今天已成功下载"""
+        self._fetched = dict(self._load_fetched(), **{key: date.today().isoformat()})
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            atomic_write_json(self.fetched_path, self._fetched)
+        except Exception as e:
+            print(f"保存基准下载记录失败: {str(e)}")
+
+    def _load_industries(self):
+        if self._industries is None:
+            self._industries = {}
+            if os.path.exists(self.industry_path):
+                try:
+                    with open(self.industry_path, 'r', encoding='utf-8') as f:
+                        self._industries = json.load(f)
+                except Exception as e:
+                    print(f"读取行业缓存失败: {str(e)}")
+        return self._industries
+
+    def industry(self, code, lookup=None):
+        """个股所属行业；未缓存时调用 lookup(code) 查询并保存，查询失败返回None"""
+        industries = self._load_industries()
+        if code in industries:
+            return industries[code]
+        if lookup is None:
+            return None
+        try:
+            name = lookup(code)
+        except Exception as e:
+            print(f"查询股票 {code} 所属行业失败: {str(e)}")
+            return None
+        if not name:
+            return None
+        industries[code] = name
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            atomic_write_json(self.industry_path, industries)
+        except Exception as e:
+            print(f"保存行业缓存失败: {str(e)}")
+        return name
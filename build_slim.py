@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+精简打包脚本 - 只包含程序实际用到的akshare模块，默认目录模式（onedir），启动更快
+
+与 build_exe.py 的区别：
+    - 不打包 akshare 的 file_fold 数据和全部接口模块，只保留 ak_lite 登记的子模块及其依赖
+    - 默认 onedir（启动时无需解压到临时目录），可用 --onefile 切换
+    - 预编译并优化字节码（--optimize 1）
+    - 打包后报告体积和冷启动时间
+
+用法：
+    python build_slim.py            # 目录模式
+    python build_slim.py --onefile  # 单文件模式
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# 尝试导入PyInstaller
+try:
+    import PyInstaller
+    import PyInstaller.__main__
+except ImportError:
+    print("错误：PyInstaller未安装！")
+    print("请运行以下命令安装：")
+    print("pip install pyinstaller")
+    sys.exit(1)
+
+try:
+    import ak_lite
+    ak_lite._ensure_package()
+except ImportError:
+    print("错误：akshare未安装！")
+    print("请运行以下命令安装：")
+    print("pip install akshare")
+    sys.exit(1)
+
+# 打包配置
+APP_NAME = "股票交易助手"
+MAIN_SCRIPT = "stock_trader.py"
+ICON_FILE = None  # 如果有图标文件，可以设置路径
+
+# 程序不需要、但可能被依赖链带入的大型库
+EXCLUDED_PACKAGES = [
+    'matplotlib', 'IPython', 'jupyter', 'notebook', 'ipykernel', 'scipy',
+    'PyQt5', 'PySide2', 'PyQt6', 'PySide6', 'pytest', 'sphinx', 'docutils',
+]
+
+
+def find_unused_akshare_modules():
+    """导入程序用到的akshare子模块，返回其余所有akshare模块（打包时排除）"""
+    for module in ak_lite.AKSHARE_MODULES:
+        __import__(module)
+    used = {name for name in sys.modules if name == 'akshare' or name.startswith('akshare.')}
+
+    akshare_path = sys.modules['akshare'].__path__[0]
+    unused = []
+    for dirpath, dirnames, filenames in os.walk(akshare_path):
+        dirnames[:] = [d for d in dirnames if d != '__pycache__']
+        rel = os.path.relpath(dirpath, akshare_path)
+        package = 'akshare' if rel == '.' else 'akshare.' + rel.replace(os.sep, '.')
+        for filename in filenames:
+            if not filename.endswith('.py'):
+                continue
+            name = package if filename == '__init__.py' else f"{package}.{filename[:-3]}"
+            if name not in used and name != 'akshare':
+                unused.append(name)
+    return sorted(used), unused
+
+
+def dir_size(path):
+    """目录或文件的总大小（字节）"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+def measure_startup(exe_path, runs=3):
+    """测量冷启动时间：程序在界面创建完成后立即退出（STOCK_TRADER_STARTUP_PROBE=1）"""
+    env = dict(os.environ, STOCK_TRADER_STARTUP_PROBE="1")
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([exe_path], env=env, timeout=300)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="精简打包")
+    parser.add_argument('--onefile', action='store_true', help="打包成单个exe文件（默认目录模式）")
+    parser.add_argument('--with-export', action='store_true', help="包含pyarrow（导出Parquet需要）")
+    parser.add_argument('--no-measure', action='store_true', help="不测量冷启动时间")
+    args = parser.parse_args()
+
+    used, unused = find_unused_akshare_modules()
+    print(f"akshare模块：保留 {len(used)} 个，排除 {len(unused)} 个")
+
+    excludes = EXCLUDED_PACKAGES + unused
+    if not args.with_export:
+        excludes.append('pyarrow')
+
+    # PyInstaller参数
+    pyi_args = [
+        MAIN_SCRIPT,
+        '--name={}'.format(APP_NAME),
+        '--onefile' if args.onefile else '--onedir',
+        '--windowed',  # 不显示控制台窗口（GUI应用）
+        '--clean',  # 清理临时文件
+        '--noconfirm',  # 覆盖输出目录
+        '--noupx',  # UPX压缩会拖慢启动
+    ]
+    # PyInstaller 6.0 起支持字节码优化
+    if int(PyInstaller.__version__.split('.')[0]) >= 6:
+        pyi_args.append('--optimize=1')
+    pyi_args.extend('--hidden-import={}'.format(m) for m in ak_lite.AKSHARE_MODULES)
+    pyi_args.extend('--exclude-module={}'.format(m) for m in excludes)
+
+    if ICON_FILE and os.path.exists(ICON_FILE):
+        pyi_args.append('--icon={}'.format(ICON_FILE))
+
+    print("开始精简打包...")
+    try:
+        PyInstaller.__main__.run(pyi_args)
+    except Exception as e:
+        print("打包失败:", str(e))
+        sys.exit(1)
+
+    exe_name = APP_NAME + ('.exe' if os.name == 'nt' else '')
+    if args.onefile:
+        output = os.path.join('dist', exe_name)
+        exe_path = output
+    else:
+        output = os.path.join('dist', APP_NAME)
+        exe_path = os.path.join(output, exe_name)
+
+    print("\n打包完成！")
+    print("输出位置: {}".format(output))
+    print("打包体积: {:.1f} MB".format(dir_size(output) / 1024 / 1024))
+
+    if not args.no_measure and os.path.exists(exe_path):
+        times = measure_startup(exe_path)
+        print("冷启动时间: 首次 {:.2f} 秒，之后 {}".format(
+            times[0], "、".join("{:.2f} 秒".format(t) for t in times[1:])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+历史日线数据质量检查
+在计算指标之前对整段日线做一次向量化检查，结果为每根K线的问题位掩码：
+    重复日期、同日重复且数值不一致、无效价格（缺失、非正、高低价矛盾）、
+    停牌（成交量为0）、长时间缺口、涨跌幅超过板块涨跌停限制、单根尖刺（突变后次日回落）
+
+重复、无效和停牌的K线从数据中剔除；最近 window 根K线内出现的严重问题（BLOCKING）使该股票不参与评分，
+界面显示为“数据异常”。已完成K线的检查结果按股票代码和数据版本（K线数、最后日期）缓存，只有出现新K线时才重新检查；
+盘中不断变化的最后一根K线每次单独检查（价格是否有效、停牌、涨跌幅是否超限）。
+"""
+
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+
+# 问题位掩码
+Q_DUPLICATE = 1
+Q_CONFLICT = 2
+Q_INVALID = 4
+Q_SUSPENDED = 8
+Q_GAP = 16
+Q_LIMIT = 32
+Q_OUTLIER = 64
+
+# 严重问题：出现在最近的K线中时不评分
+BLOCKING = Q_CONFLICT | Q_INVALID | Q_LIMIT | Q_OUTLIER
+
+QUALITY_LABELS = {
+    Q_DUPLICATE: "重复日期",
+    Q_CONFLICT: "重复日期数据不一致",
+    Q_INVALID: "价格无效",
+    Q_SUSPENDED: "停牌",
+    Q_GAP: "数据缺口",
+    Q_LIMIT: "涨跌幅超限",
+    Q_OUTLIER: "异常尖刺",
+}
+
+# 各板块涨跌幅限制（ST股票的限制更严，按所在板块检查只会放宽，不会误判）
+PRICE_LIMITS = {
+    '主板': 0.10,
+    '创业板': 0.20,
+    '科创板': 0.20,
+    '北交所': 0.30,
+}
+
+MAX_GAP_DAYS = 12  # 相邻交易日间隔超过该自然日数视为缺口（春节、国庆长假不超过）
+LIMIT_TOLERANCE = 0.011  # 涨跌停价按分四舍五入，允许的绝对误差（元）
+LISTING_DAYS = 5  # 新股上市前5个交易日不设涨跌幅限制
+OUTLIER_Z = 8.0  # 尖刺判定的稳健Z值阈值
+OUTLIER_MIN_MOVE = 0.05  # 尖刺至少的单日对数收益幅度
+
+
+def quality_names(flags):
+    """问题位掩码对应的名称列表"""
+    return [label for bit, label in QUALITY_LABELS.items() if flags & bit]
+
+
+def _column(hist, name):
+    if name not in hist.columns:
+        return None
+    return pd.to_numeric(hist[name], errors='coerce').to_numpy(dtype=float)
+
+
+def data_version(hist):
+    """数据版本：行数和首末日期（不含价格，盘中最新价变化不改变版本；除权带来的前复权价变化总是伴随新K线）"""
+    if hist is None or hist.empty:
+        return None
+    return (len(hist), str(hist['日期'].iloc[0])[:10], str(hist['日期'].iloc[-1])[:10])
+
+
+def _bad_prices(close, high, low, open_):
+    """收盘价缺失或非正，或最高价低于开盘、收盘、最低价"""
+    with np.errstate(invalid='ignore'):
+        invalid = ~(close > 0)
+        if high is not None and low is not None:
+            top = close if open_ is None else np.fmax(close, open_)
+            bottom = close if open_ is None else np.fmin(close, open_)
+            invalid |= (high < low - LIMIT_TOLERANCE) | (high < top - LIMIT_TOLERANCE) | (low > bottom + LIMIT_TOLERANCE)
+    return invalid
+
+
+def _limit_excess(close, prev, limit):
+    """涨跌幅是否超过涨跌停限制（允许按分四舍五入的误差）"""
+    return np.abs(close - prev) > prev * limit + LIMIT_TOLERANCE
+
+
+@dataclass
+class QualityReport:
+    """一只股票的检查结果"""
+    flags: int = 0  # 整段数据中出现的问题
+    blocking: int = 0  # 最近K线中出现的严重问题，非0时不评分
+    counts: dict = field(default_factory=dict)  # 问题名称 -> K线数
+    rows: np.ndarray = None  # 可用K线在原数据中的位置（按日期排序）
+    version: tuple = None
+
+    @property
+    def ok(self):
+        return self.blocking == 0
+
+    def clean(self, hist):
+        """剔除重复、无效和停牌K线后的数据"""
+        if self.rows is None or len(self.rows) == len(hist) and (np.diff(self.rows) > 0).all():
+            return hist
+        return hist.iloc[self.rows].reset_index(drop=True)
+
+    def summary(self):
+        return {'flags': quality_names(self.flags), 'blocking': quality_names(self.blocking), 'counts': self.counts}
+
+
+def _flag_rows(hist, board, listing_date):
+    """逐根K线检查，返回(按日期排序的日期, 排序位置, 各K线的问题位, 可用K线在排序后的位置)"""
+    n = len(hist)
+    dates = hist['日期'].astype(str).str[:10].to_numpy().astype('U10')
+    order = np.argsort(dates, kind='stable')
+    dates = dates[order]
+    close = _column(hist, '收盘')[order]
+    volume = _column(hist, '成交量')
+    volume = volume[order] if volume is not None else None
+    row_flags = np.zeros(n, dtype=np.int64)
+
+    # 重复日期：保留最后一条，数值不一致时为严重问题
+    dup = np.zeros(n, dtype=bool)
+    dup[:-1] = dates[:-1] == dates[1:]
+    if dup.any():
+        conflict = np.zeros(n, dtype=bool)
+        with np.errstate(invalid='ignore'):
+            differs = ~np.isclose(close[:-1], close[1:], equal_nan=True)
+            if volume is not None:
+                differs |= ~np.isclose(volume[:-1], volume[1:], equal_nan=True)
+        conflict[:-1] = dup[:-1] & differs
+        row_flags[dup] |= Q_DUPLICATE
+        row_flags[conflict] |= Q_CONFLICT
+
+    # 无效价格：收盘价缺失或非正，最高价低于开盘、收盘或最低价
+    high, low, open_ = (_column(hist, name) for name in ('最高', '最低', '开盘'))
+    invalid = _bad_prices(close, *(None if col is None else col[order] for col in (high, low, open_)))
+    row_flags[invalid] |= Q_INVALID
+
+    # 停牌：有成交量列且成交量为0
+    suspended = np.zeros(n, dtype=bool)
+    if volume is not None:
+        suspended = volume <= 0
+        row_flags[suspended] |= Q_SUSPENDED
+
+    keep = np.flatnonzero(~dup & ~invalid & ~suspended)
+    kept_close = close[keep]
+    kept_days = dates[keep].astype('datetime64[D]')
+
+    if len(keep) > 1:
+        prev = kept_close[:-1]
+        # 缺口：相邻两根可用K线之间的自然日间隔过长（长期停牌或缺失数据）
+        gap = np.diff(kept_days).astype(int) > MAX_GAP_DAYS
+        row_flags[keep[1:][gap]] |= Q_GAP
+
+        # 涨跌幅超限：缺口后的复牌首日和新股上市初期除外
+        limit = PRICE_LIMITS.get(board)
+        if limit is not None:
+            exempt = gap.copy()
+            if listing_date:
+                listed = np.datetime64(str(listing_date)[:10], 'D')
+                head = kept_days[1:LISTING_DAYS + 1]
+                exempt[:len(head)] |= (head - listed).astype(int) <= LISTING_DAYS * 3
+            else:
+                exempt[:LISTING_DAYS] = True
+            excess = _limit_excess(kept_close[1:], prev, limit)
+            row_flags[keep[1:][excess & ~exempt]] |= Q_LIMIT
+
+        # 尖刺：单日大幅变动后次日反向回落（错误报价的典型形态），按稳健Z值判断
+        returns = np.log(kept_close[1:] / prev)
+        if len(returns) > 2:
+            center = np.median(returns)
+            scale = 1.4826 * np.median(np.abs(returns - center))
+            if scale > 0:
+                z = (returns - center) / scale
+                jump, back = returns[:-1], returns[1:]
+                spike = ((np.abs(z[:-1]) > OUTLIER_Z) & (np.abs(z[1:]) > OUTLIER_Z)
+                         & (np.sign(jump) != np.sign(back)) & (np.abs(jump) > OUTLIER_MIN_MOVE)
+                         & (np.abs(jump + back) < 0.5 * np.abs(jump)))
+                row_flags[keep[1:-1][spike]] |= Q_OUTLIER
+    return dates, order, row_flags, keep
+
+
+def validate(hist, board='', listing_date=None, window=60):
+    """
+    检查一段日线（需包含日期、收盘列，开盘、最高、最低、成交量列可选）
+    board 为板块名称（决定涨跌幅限制，未知板块不检查），listing_date 为上市日期（YYYY-MM-DD），
+    未知时数据的前 LISTING_DAYS 个涨跌幅都不检查（可能是新股上市初期）；
+    window 为判定严重问题的最近K线数，None 表示整段数据
+    """
+    n = len(hist)
+    if n == 0:
+        return QualityReport(flags=Q_INVALID, blocking=Q_INVALID, rows=np.arange(0))
+    dates, order, row_flags, keep = _flag_rows(hist, board, listing_date)
+
+    # 严重问题只看最近 window 根可用K线覆盖的日期范围
+    if len(keep) == 0:
+        recent = np.ones(n, dtype=bool)
+        row_flags |= Q_INVALID
+    elif window is None or len(keep) <= window:
+        recent = np.ones(n, dtype=bool)
+    else:
+        recent = dates >= dates[keep[-window]]
+
+    flags = int(np.bitwise_or.reduce(row_flags))
+    blocking = int(np.bitwise_or.reduce(row_flags[recent])) & BLOCKING
+    counts = {label: int(np.count_nonzero(row_flags & bit))
+              for bit, label in QUALITY_LABELS.items() if flags & bit}
+    return QualityReport(flags=flags, blocking=blocking, counts=counts, rows=order[keep])
+
+
+def rolling_blocking(hist, board='', listing_date=None, window=60):
+    """
+    逐根K线回看的严重问题，用于历史导出：返回(可用K线在原数据中的位置, 各可用K线的严重问题位)，
+    每根可用K线的问题位为以它结尾的最近 window 根可用K线范围内出现的 BLOCKING 问题，window 为 None 表示从数据开头算起；
+    按整段数据检查，尖刺这类要看后一根K线才能判断的问题在出现当天就会标出
+    """
+    if len(hist) == 0:
+        return np.arange(0), np.zeros(0, dtype=np.int64)
+    dates, order, row_flags, keep = _flag_rows(hist, board, listing_date)
+    bits = np.array([bit for bit in QUALITY_LABELS if bit & BLOCKING], dtype=np.int64)
+    # 各问题位的累计K线数，区间内出现次数 = 区间两端累计数之差
+    counts = np.zeros((len(dates) + 1, len(bits)), dtype=np.int64)
+    counts[1:] = np.cumsum((row_flags[:, None] & bits) != 0, axis=0)
+    first = np.arange(len(keep)) - (len(keep) if window is None else window - 1)
+    start = np.searchsorted(dates, dates[keep[np.maximum(first, 0)]], side='left')
+    present = counts[keep + 1] - counts[start] > 0
+    return order[keep], (present * bits).sum(axis=1)
+
+
+def check_last_bar(report, hist, board='', listing_date=None):
+    """
+    在已完成K线的检查结果上追加最后一根（盘中）K线的检查，返回新的结果，不修改 report
+    report 为 hist 除最后一行外的检查结果，hist 需按日期升序且最后一行日期大于前一行
+    """
+    last = len(hist) - 1
+    bar = hist.iloc[-1:]
+    close, high, low, open_, volume = (_column(bar, name) for name in ('收盘', '最高', '最低', '开盘', '成交量'))
+    flags = 0
+    if _bad_prices(close, high, low, open_)[0]:
+        flags |= Q_INVALID
+    if volume is not None and volume[0] <= 0:
+        flags |= Q_SUSPENDED
+    rows = report.rows
+    limit = PRICE_LIMITS.get(board)
+    if not flags and len(rows):
+        day = np.datetime64(str(hist['日期'].iloc[-1])[:10], 'D')
+        gap = (day - np.datetime64(str(hist['日期'].iloc[rows[-1]])[:10], 'D')).astype(int) > MAX_GAP_DAYS
+        if gap:
+            flags |= Q_GAP
+        if listing_date:
+            listing = (day - np.datetime64(str(listing_date)[:10], 'D')).astype(int) <= LISTING_DAYS * 3
+        else:
+            listing = len(rows) <= LISTING_DAYS
+        prev = float(pd.to_numeric(hist['收盘'].iloc[rows[-1]], errors='coerce'))
+        if limit is not None and not gap and not listing and _limit_excess(close[0], prev, limit):
+            flags |= Q_LIMIT
+    if not flags & (Q_INVALID | Q_SUSPENDED):
+        rows = np.append(rows, last)
+    counts = dict(report.counts)
+    for bit, label in QUALITY_LABELS.items():
+        if flags & bit:
+            counts[label] = counts.get(label, 0) + 1
+    return QualityReport(flags=report.flags | flags, blocking=report.blocking | (flags & BLOCKING),
+                         counts=counts, rows=rows, version=report.version)
+
+
+class QualityGate:
+    """按股票代码缓存已完成K线的检查结果，没有新K线时只检查最后一根K线"""
+
+    def __init__(self, window=60):
+        self.window = window
+        self._reports = {}  # 代码 -> 已完成K线（除最后一行外）的 QualityReport
+
+    def check(self, code, hist, board='', listing_date=None):
+        dates = hist['日期']
+        if len(hist) < 2 or str(dates.iloc[-1])[:10] <= str(dates.iloc[-2])[:10]:
+            # 未排序或最后一行重复时整段检查
+            return validate(hist, board, listing_date, self.window)
+        completed = hist.iloc[:-1]
+        version = data_version(completed)
+        report = self._reports.get(code)
+        if report is None or report.version != version:
+            report = validate(completed, board, listing_date, self.window)
+            report.version = version
+            self._reports[code] = report
+        return check_last_bar(report, hist, board, listing_date)
+
+    def get(self, code):
+        """最近一次的检查结果，没有时返回None"""
+        return self._reports.get(code)
+
+    def forget(self, code):
+        self._reports.pop(code, None)
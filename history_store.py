@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地历史行情缓存
+只保存不复权日线（stock_zh_a_hist adjust=""）和每只股票的除权除息复权因子表，
+前复权、后复权序列在本地用累积乘积推导，不再分别下载三种复权数据。
+
+复权因子由不复权数据本身得到：交易所在除权除息日公布的前收盘参考价 = 收盘 - 涨跌额，
+与上一交易日实际收盘价之比即为当日的复权因子（非除权日为1）。
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from atomic_file import atomic_write_csv
+
+PRICE_COLUMNS = ['开盘', '收盘', '最高', '最低']
+
+
+def derive_factors(raw):
+    """从不复权日线推导除权除息事件及复权因子"""
+    close = pd.to_numeric(raw['收盘'], errors='coerce')
+    prev_close = close.shift(1)
+    if '涨跌额' in raw.columns:
+        ref_prev = close - pd.to_numeric(raw['涨跌额'], errors='coerce')
+        # 价格精确到分，非除权日两者相等
+        event = (prev_close - ref_prev).abs() > 0.005
+    else:
+        ref_prev = close / (1 + pd.to_numeric(raw['涨跌幅'], errors='coerce') / 100)
+        event = (prev_close / ref_prev - 1).abs() > 0.002
+    event &= (ref_prev > 0) & prev_close.notna()
+    return pd.DataFrame({
+        '日期': raw['日期'][event].values,
+        '前收盘': prev_close[event].values,
+        '除权参考价': ref_prev[event].round(3).values,
+        '复权因子': (prev_close / ref_prev)[event].values,
+    })
+
+
+def apply_factors(raw, factors, adjust="qfq"):
+    """
+    用复权因子表把不复权日线换算为前复权(qfq)或后复权(hfq)
+    后复权系数为因子的累积乘积，前复权系数为后复权系数除以最新值
+    """
+    if adjust not in ("qfq", "hfq") or factors is None or factors.empty:
+        return raw.copy()
+    ratio = np.ones(len(raw))
+    rows = pd.Index(raw['日期'].values).get_indexer(factors['日期'].values)
+    ratio[rows[rows >= 0]] = factors['复权因子'].values[rows >= 0]
+    scale = np.cumprod(ratio)
+    if adjust == "qfq":
+        scale = scale / scale[-1]
+    data = raw.copy()
+    for col in PRICE_COLUMNS:
+        if col in data.columns:
+            data[col] = pd.to_numeric(data[col], errors='coerce') * scale
+    if '涨跌额' in data.columns:
+        data['涨跌额'] = data['收盘'].diff().fillna(pd.to_numeric(raw['涨跌额'], errors='coerce') * scale)
+    return data
+
+
+class HistoryStore:
+    """按股票代码保存不复权日线和复权因子"""
+
+    def __init__(self, directory="history_cache"):
+        self.directory = directory
+        self.raw_dir = os.path.join(directory, "raw")
+        self.factor_dir = os.path.join(directory, "factors")
+
+    def raw_path(self, code):
+        return os.path.join(self.raw_dir, f"{code}.csv")
+
+    def factor_path(self, code):
+        return os.path.join(self.factor_dir, f"{code}.csv")
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_csv(path, dtype={'日期': str, '股票代码': str}, encoding='utf-8')
+        except Exception as e:
+            print(f"读取历史缓存失败 {path}: {str(e)}")
+            return None
+
+    def load_raw(self, code):
+        """读取不复权日线，不存在时返回None"""
+        return self._read(self.raw_path(code))
+
+    def load_factors(self, code):
+        """读取复权因子表，不存在时返回None"""
+        return self._read(self.factor_path(code))
+
+    def last_date(self, code, raw=None):
+        """已缓存的最后交易日（YYYYMMDD），没有缓存时返回None；raw 为已读取的不复权日线"""
+        if raw is None:
+            raw = self.load_raw(code)
+        if raw is None or raw.empty:
+            return None
+        return str(raw['日期'].iloc[-1])[:10].replace('-', '')
+
+    def append_raw(self, code, new_data, raw=None):
+        """
+        合并新下载的不复权日线（同一日期以新数据为准），并重新推导复权因子，返回合并后的数据
+        raw 为已读取的缓存（避免重复读取文件）。合并结果与缓存相同（没有新交易日且最后一根K线未变）时不重写文件，
+        盘中最后一根K线变化时仍然落盘，保证收盘后缓存中是当日最终数据
+        """
+        if raw is None:
+            raw = self.load_raw(code)
+        new_data = new_data.copy()
+        new_data['日期'] = new_data['日期'].astype(str).str[:10]
+        if raw is not None and not raw.empty:
+            merged = pd.concat([raw, new_data], ignore_index=True)
+        else:
+            merged = new_data
+        merged = merged.drop_duplicates(subset='日期', keep='last').sort_values('日期').reset_index(drop=True)
+        factors = derive_factors(merged)
+        if raw is not None and len(merged) == len(raw) and self._same_row(merged, raw):
+            return merged, factors
+        try:
+            os.makedirs(self.raw_dir, exist_ok=True)
+            os.makedirs(self.factor_dir, exist_ok=True)
+            atomic_write_csv(merged, self.raw_path(code))
+            atomic_write_csv(factors, self.factor_path(code))
+        except Exception as e:
+            print(f"缓存股票 {code} 历史数据失败: {str(e)}")
+        return merged, factors
+
+    @staticmethod
+    def _same_row(merged, raw):
+        """合并后的最后一行与缓存的最后一行按写入文件的文本比较是否相同"""
+        last = merged.iloc[-1:]
+        cached = raw.iloc[-1:].reindex(columns=last.columns)
+        return last.to_csv(index=False) == cached.to_csv(index=False)
+
+    def load(self, code, adjust="qfq"):
+        """读取历史数据并按需复权（qfq前复权/hfq后复权/空字符串不复权），不存在时返回None"""
+        raw = self.load_raw(code)
+        if raw is None or raw.empty:
+            return None
+        return apply_factors(raw, self.load_factors(code), adjust)
+
+    def codes(self):
+        """已缓存的股票代码"""
+        if not os.path.isdir(self.raw_dir):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.raw_dir) if name.endswith('.csv'))
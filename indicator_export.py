@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+指标与建议历史导出
+把本地缓存的历史数据逐只股票计算指标、得分和建议，按行组分块流式写入 Parquet 或 Arrow IPC 文件。
+每次导出只追加上次导出之后、已收盘的新交易日（记录在 _manifest.json 中），旧数据不会重写；
+盘中的当日K线不导出，收盘后的下一次导出再写入当日的最终数据。
+导出前与程序一样做数据质量检查：重复、无效和停牌K线不导出，最近K线有严重问题的行不评分，
+建议记为数据异常，quality 列为该行回看范围内的严重问题位（data_quality.BLOCKING）。
+有基准指数缓存时与程序一样计算相对强弱（rs 列）并计入得分和建议。
+导出目录可直接用 pandas.read_parquet("export") 或 DuckDB read_parquet('export/*.parquet') 读取。
+
+用法：
+    python indicator_export.py --format parquet --out export
+"""
+
+import argparse
+import json
+import os
+import uuid
+from datetime import datetime, time, timedelta
+import numpy as np
+
+from atomic_file import atomic_write_json
+from advice import AdviceParams, AdviceCode, score_batch, indicator_arrays
+from benchmark import BenchmarkStore
+from data_quality import rolling_blocking
+from history_store import HistoryStore
+from symbol_master import get_exchange_board
+
+# pyarrow 为可选依赖，仅导出时需要
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+INDICATOR_COLUMNS = ['rsi', 'ma5', 'ma20', 'macd', 'macd_signal', 'volume_ratio', 'price_trend', 'rs']
+
+MARKET_CLOSE = time(15, 30)  # 收盘（15:00）后留出数据源更新时间，此后当日K线视为完成
+
+
+def last_completed_date(now=None):
+    """最后一个已收盘的日期（YYYY-MM-DD），收盘前为前一天"""
+    now = now or datetime.now()
+    day = now.date() if now.time() >= MARKET_CLOSE else now.date() - timedelta(days=1)
+    return day.isoformat()
+
+
+def export_schema():
+    """导出文件的表结构"""
+    return pa.schema(
+        [('code', pa.string()), ('date', pa.date32()), ('close', pa.float64()), ('change_pct', pa.float64())]
+        + [(name, pa.float64()) for name in INDICATOR_COLUMNS]
+        + [('score', pa.float64()), ('advice', pa.int8()), ('indicator_mask', pa.int16()), ('accuracy', pa.float64()),
+           ('quality', pa.int16())]
+    )
+
+
+class IndicatorExporter:
+    """流式导出器：内存中最多保留一只股票的历史和一个行组的缓冲"""
+
+    def __init__(self, out_dir="export", file_format="parquet", chunk_rows=100000, params=None, quality_window=60,
+                 benchmark=None):
+        if pa is None:
+            raise ImportError("导出需要 pyarrow，请运行: pip install pyarrow")
+        self.out_dir = out_dir
+        self.file_format = file_format
+        self.chunk_rows = chunk_rows
+        self.params = params or AdviceParams()
+        self.quality_window = quality_window  # 判定严重问题的最近K线数，与程序的质量检查一致
+        self.benchmark = benchmark  # 相对强弱的基准(日期数组, 收盘价数组)，None 时 rs 列为空
+        self.manifest_path = os.path.join(out_dir, "_manifest.json")
+        self.manifest = self.load_manifest()
+        self.schema = export_schema()
+
+    def load_manifest(self):
+        """读取每只股票已导出的最后日期"""
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"读取导出记录失败，将重新导出: {str(e)}")
+        return {}
+
+    def save_manifest(self):
+        atomic_write_json(self.manifest_path, self.manifest)
+
+    def symbol_batch(self, code, hist_data, until=None):
+        """计算一只股票尚未导出、日期不晚于 until 的行，返回 RecordBatch（没有新数据时返回None）"""
+        rows, blocking = rolling_blocking(hist_data, get_exchange_board(code)[1], window=self.quality_window)
+        if len(rows) == 0:
+            return None
+        ind = indicator_arrays(hist_data.iloc[rows], self.benchmark, self.params.rs_lookback)
+        ind.setdefault('rs', np.full(len(ind['price']), np.nan))
+        dates = ind['date']
+        new = dates > self.manifest.get(code, '')
+        if until is not None:
+            new &= dates <= until
+        if not new.any():
+            return None
+        score, advice, mask, accuracy = score_batch(ind, self.params)
+        # 有严重数据问题的行不评分
+        bad = blocking != 0
+        score = np.where(bad, np.nan, score)
+        advice = np.where(bad, AdviceCode.BAD_DATA, advice)
+        mask = np.where(bad, 0, mask)
+        accuracy = np.where(bad, np.nan, accuracy)
+        columns = {
+            'code': np.full(int(new.sum()), code),
+            'date': dates[new].astype('datetime64[D]'),
+            'close': ind['price'][new],
+            'change_pct': ind['change_pct'][new],
+        }
+        for name in INDICATOR_COLUMNS:
+            columns[name] = ind[name][new]
+        columns['score'] = score[new]
+        columns['advice'] = advice[new].astype(np.int8)
+        columns['indicator_mask'] = mask[new].astype(np.int16)
+        columns['accuracy'] = accuracy[new]
+        columns['quality'] = blocking[new].astype(np.int16)
+        return pa.RecordBatch.from_arrays(
+            [pa.array(columns[field.name], type=field.type) for field in self.schema], schema=self.schema)
+
+    def _open_writer(self, path):
+        if self.file_format == 'arrow':
+            return pa.ipc.new_file(path, self.schema)
+        return pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def _write(self, writer, batches):
+        """把缓冲的批次合并为一个行组写出"""
+        table = pa.Table.from_batches(batches, schema=self.schema)
+        if self.file_format == 'arrow':
+            for batch in table.combine_chunks().to_batches():
+                writer.write_batch(batch)
+        else:
+            writer.write_table(table, row_group_size=len(table))
+
+    def export(self, store, codes=None):
+        """增量导出，返回写入的行数"""
+        codes = codes if codes is not None else store.codes()
+        until = last_completed_date()
+        os.makedirs(self.out_dir, exist_ok=True)
+        suffix = 'arrow' if self.file_format == 'arrow' else 'parquet'
+        # 文件名带随机后缀，同一秒内的两次导出不会互相覆盖
+        name = f"part-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.out_dir, f"{name}.{suffix}")
+        tmp_path = path + ".tmp"
+
+        writer = None
+        buffer, buffered = [], 0
+        total = 0
+        exported = {}
+        try:
+            for code in codes:
+                hist_data = store.load(code)
+                if hist_data is None or hist_data.empty:
+                    continue
+                try:
+                    batch = self.symbol_batch(code, hist_data, until)
+                except Exception as e:
+                    print(f"导出股票 {code} 失败: {str(e)}")
+                    continue
+                if batch is None:
+                    continue
+                buffer.append(batch)
+                buffered += batch.num_rows
+                exported[code] = batch.column(self.schema.get_field_index('date'))[-1].as_py().isoformat()
+                if buffered >= self.chunk_rows:
+                    writer = writer or self._open_writer(tmp_path)
+                    self._write(writer, buffer)
+                    total += buffered
+                    buffer, buffered = [], 0
+            if buffer:
+                writer = writer or self._open_writer(tmp_path)
+                self._write(writer, buffer)
+                total += buffered
+        except Exception:
+            if writer is not None:
+                writer.close()
+                os.remove(tmp_path)
+            raise
+
+        if writer is None:
+            print("没有新的数据需要导出")
+            return 0
+        writer.close()
+        # 文件写完后再改名并更新导出记录，中途失败不会留下半个文件
+        os.replace(tmp_path, path)
+        self.manifest.update(exported)
+        self.save_manifest()
+        print(f"导出完成: {path}，共 {total} 行，{len(exported)} 只股票")
+        return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出指标与建议历史")
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet', help="文件格式")
+    parser.add_argument('--out', default="export", help="导出目录")
+    parser.add_argument('--chunk-rows', type=int, default=100000, help="每个行组的行数")
+    parser.add_argument('--cache-dir', default="history_cache", help="历史数据缓存目录")
+    parser.add_argument('--codes', nargs='+', help="只导出指定股票")
+    parser.add_argument('--benchmark', default="000300", help="计算相对强弱的基准指数代码（使用程序缓存的指数日线）")
+    args = parser.parse_args()
+
+    benchmark = BenchmarkStore(os.path.join(args.cache_dir, "benchmarks")).load(BenchmarkStore.index_key(args.benchmark))
+    if benchmark is None:
+        print(f"没有基准指数 {args.benchmark} 的缓存，不计算相对强弱")
+    exporter = IndicatorExporter(args.out, args.format, args.chunk_rows, AdviceParams.load("advice_params.json"),
+                                 benchmark=benchmark)
+    exporter.export(HistoryStore(args.cache_dir), args.codes)
+
+
+if __name__ == "__main__":
+    main()
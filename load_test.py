@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+界面与刷新流程压力测试
+用模拟行情（sim_feed）代替akshare，按设定的股票数量和刷新间隔运行完整的程序界面，
+结束后报告界面帧延迟、界面更新队列深度和刷新吞吐量。
+
+所有缓存文件写入临时目录，不影响正常使用的自选列表和历史缓存。
+
+用法：
+    python load_test.py --symbols 5000 --watchlist 5000 --interval 1 --duration 60
+    python load_test.py --watchlist 500 --latency 0.01 --error-rate 0.02 --speed 600
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tkinter as tk
+import numpy as np
+
+from sim_feed import FakeClock, SimulatedMarket
+
+FRAME_INTERVAL = 16  # 帧探针间隔（毫秒），约60帧/秒
+
+
+class FrameProbe:
+    """定时在界面线程上执行，记录实际执行时刻比预期晚了多少（即界面卡顿时长）和队列深度"""
+
+    def __init__(self, root, app, interval=FRAME_INTERVAL):
+        self.root = root
+        self.app = app
+        self.interval = interval
+        self.latencies = []
+        self.depths = []
+        self._expected = None
+
+    def start(self):
+        self._expected = time.perf_counter() + self.interval / 1000
+        self.root.after(self.interval, self._tick)
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.latencies.append(max(now - self._expected, 0.0) * 1000)
+        self.depths.append(self.app.ui_pending)
+        self._expected = now + self.interval / 1000
+        self.root.after(self.interval, self._tick)
+
+
+def percentiles(values, points=(50, 95, 99)):
+    if not values:
+        return {p: float('nan') for p in points}
+    return {p: float(np.percentile(values, p)) for p in points}
+
+
+def report(args, app, market, probe, elapsed):
+    """打印测试结果，返回结果字典"""
+    refreshes = list(app.refresh_history)
+    durations = [r['duration'] for r in refreshes]
+    symbols = sum(r['success'] for r in refreshes)
+    latency = percentiles(probe.latencies)
+    result = {
+        'symbols': args.symbols,
+        'watchlist': len(app.watchlist),
+        'interval': args.interval,
+        'elapsed': round(elapsed, 2),
+        'frames': len(probe.latencies),
+        'frame_latency_ms': {f"p{p}": round(v, 2) for p, v in latency.items()},
+        'frame_latency_max_ms': round(max(probe.latencies), 2) if probe.latencies else None,
+        'frames_over_100ms': int(sum(1 for v in probe.latencies if v > 100)),
+        'queue_depth_mean': round(float(np.mean(probe.depths)), 2) if probe.depths else None,
+        'queue_depth_max': int(max(probe.depths)) if probe.depths else None,
+        'refreshes': len(refreshes),
+        'refresh_skipped': app.refresh_skipped,
+        'refresh_duration_mean': round(float(np.mean(durations)), 3) if durations else None,
+        'refresh_duration_max': round(float(max(durations)), 3) if durations else None,
+        'symbols_per_second': round(symbols / elapsed, 1) if elapsed else None,
+        'upstream_requests': market.requests,
+        'upstream_errors': app.rate_controller.metrics()['errors'],
+    }
+
+    print("\n===== 压力测试结果 =====")
+    print(f"模拟股票 {result['symbols']} 只，自选 {result['watchlist']} 只，刷新间隔 {args.interval} 秒，"
+          f"运行 {result['elapsed']} 秒")
+    print(f"界面帧延迟: p50 {latency[50]:.1f} ms  p95 {latency[95]:.1f} ms  p99 {latency[99]:.1f} ms  "
+          f"最大 {result['frame_latency_max_ms']} ms，超过100ms的帧 {result['frames_over_100ms']}/{result['frames']}")
+    print(f"界面更新队列深度: 平均 {result['queue_depth_mean']}，最大 {result['queue_depth_max']}")
+    print(f"刷新: 完成 {result['refreshes']} 次，因上一次未完成跳过 {result['refresh_skipped']} 次，"
+          f"平均耗时 {result['refresh_duration_mean']} 秒，最长 {result['refresh_duration_max']} 秒")
+    print(f"吞吐量: {result['symbols_per_second']} 只股票/秒，上游请求 {result['upstream_requests']} 次，"
+          f"错误 {result['upstream_errors']} 次")
+    if result['refresh_duration_mean'] and result['refresh_duration_mean'] > args.interval:
+        print(f"结论: 刷新跟不上 {args.interval} 秒的间隔")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="界面与刷新流程压力测试（模拟行情）")
+    parser.add_argument('--symbols', type=int, default=5000, help="模拟全市场股票数量")
+    parser.add_argument('--watchlist', type=int, default=500, help="自选股票数量（每次刷新的股票数）")
+    parser.add_argument('--interval', type=float, default=1.0, help="自动刷新间隔（秒）")
+    parser.add_argument('--duration', type=float, default=60.0, help="测试时长（秒）")
+    parser.add_argument('--speed', type=float, default=60.0, help="模拟时钟相对真实时间的倍速")
+    parser.add_argument('--latency', type=float, default=0.0, help="每次模拟请求的延迟（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="模拟请求失败比例")
+    parser.add_argument('--request-rate', type=float, default=1000.0, help="请求速率上限（每秒）")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--workdir', default=None, help="缓存文件目录（默认使用临时目录）")
+    parser.add_argument('--output', default=None, help="把结果保存为JSON文件")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="stock_trader_load_")
+    os.makedirs(workdir, exist_ok=True)
+    # 程序使用相对路径保存缓存，切换到测试目录
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+    from stock_trader import StockTrader
+
+    print(f"生成 {args.symbols} 只股票的模拟行情...")
+    market = SimulatedMarket(symbols=args.symbols, clock=FakeClock(speed=args.speed), seed=args.seed,
+                             latency=args.latency, error_rate=args.error_rate, request_rate=args.request_rate)
+    with open("watchlist.json", 'w', encoding='utf-8') as f:
+        json.dump(market.codes[:args.watchlist], f)
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"无法创建界面（需要图形环境，Linux下可用 xvfb-run 运行）: {str(e)}")
+        sys.exit(1)
+    app = StockTrader(root, refresh_interval=args.interval, feed=market)
+    # 每次刷新都取最新的全市场快照
+    app.cache_timeout = min(app.cache_timeout, args.interval)
+
+    probe = FrameProbe(root, app)
+    probe.start()
+    start = time.perf_counter()
+    root.after(int(args.duration * 1000), root.destroy)
+    print(f"开始测试，时长 {args.duration} 秒，缓存目录 {workdir}")
+    app.run()
+    result = report(args, app, market, probe, time.perf_counter() - start)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+刷新周期性能分析
+用 --profile 参数或环境变量 STOCK_TRADER_PROFILE=1 开启后，下一次刷新会在
+cProfile、tracemalloc 和栈采样下运行，结果写入 profiles/<时间戳>/：
+    refresh.pstats      cProfile统计（可用 snakeviz / pstats 查看）
+    refresh_stats.txt   按累计耗时排序的文本报告
+    refresh.collapsed   折叠栈格式，可直接交给 flamegraph.pl / speedscope 生成火焰图
+    allocations.txt     内存分配排行
+未开启时不做任何包装，没有额外开销。
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+ENV_VAR = "STOCK_TRADER_PROFILE"
+
+
+def profiling_requested():
+    """环境变量是否要求开启性能分析"""
+    return os.environ.get(ENV_VAR, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class StackSampler:
+    """定时采样指定线程的调用栈，生成折叠栈计数"""
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(names))] += 1
+            time.sleep(self.interval)
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def profile_call(func, out_root="profiles", name="refresh", top=30):
+    """在性能分析下运行func，返回(func返回值, 输出目录)"""
+    out_dir = os.path.join(out_root, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(out_dir, exist_ok=True)
+
+    tracemalloc.start(25)
+    sampler = StackSampler(threading.get_ident())
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    sampler.start()
+    profile.enable()
+    try:
+        result = func()
+    finally:
+        profile.disable()
+        sampler.stop()
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profile.dump_stats(os.path.join(out_dir, f"{name}.pstats"))
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).sort_stats('cumulative').print_stats(60)
+        with open(os.path.join(out_dir, f"{name}_stats.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"总耗时: {elapsed:.3f} 秒\n\n")
+            f.write(text.getvalue())
+        sampler.write(os.path.join(out_dir, f"{name}.collapsed"))
+
+        with open(os.path.join(out_dir, "allocations.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"当前内存: {current / 1024 / 1024:.2f} MB，峰值: {peak / 1024 / 1024:.2f} MB\n\n")
+            f.write(f"按代码行排名前 {top} 的分配:\n")
+            for stat in snapshot.statistics('lineno')[:top]:
+                f.write(f"{stat}\n")
+            f.write(f"\n按调用栈排名前 10 的分配:\n")
+            for stat in snapshot.statistics('traceback')[:10]:
+                f.write(f"\n{stat.size / 1024:.1f} KiB，{stat.count} 个对象\n")
+                for line in stat.traceback.format(limit=10):
+                    f.write(f"{line}\n")
+        print(f"性能分析结果已保存到 {out_dir}（耗时 {elapsed:.3f} 秒）")
+    return result, out_dir
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+上游请求速率控制
+所有akshare调用共享一个AIMD（加性增、乘性减）速率控制器：请求成功时逐步提高速率，
+出错（尤其是连接被重置）时大幅降低速率；重试使用带随机抖动的指数退避。
+"""
+
+import random
+import threading
+import time
+
+
+def is_connection_error(exc):
+    """是否为连接类错误（连接被重置、断开、超时等）"""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    name = type(exc).__name__
+    return 'Connection' in name or 'Timeout' in name or 'RemoteDisconnected' in str(exc)
+
+
+class RateController:
+    """AIMD速率控制器（线程安全）"""
+
+    def __init__(self, initial_rate=2.0, min_rate=0.2, max_rate=20.0, increase=0.2,
+                 decrease=0.5, connection_decrease=0.25, base_delay=0.5, max_delay=10.0):
+        self.rate = initial_rate  # 每秒请求数
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase  # 每次成功增加的速率
+        self.decrease = decrease  # 普通错误时的速率乘数
+        self.connection_decrease = connection_decrease  # 连接错误时的速率乘数
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.connection_errors = 0
+        self.retries = 0
+
+    def acquire(self):
+        """按当前速率等待下一个请求时隙"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + 1.0 / self.rate
+            self.requests += 1
+        if start > now:
+            time.sleep(start - now)
+
+    def on_success(self):
+        with self._lock:
+            self.successes += 1
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_error(self, exc):
+        with self._lock:
+            self.errors += 1
+            if is_connection_error(exc):
+                self.connection_errors += 1
+                factor = self.connection_decrease
+            else:
+                factor = self.decrease
+            self.rate = max(self.min_rate, self.rate * factor)
+            # 降速立即生效，推迟下一个时隙
+            self._next_time = max(self._next_time, time.monotonic() + 1.0 / self.rate)
+
+    def backoff(self, attempt):
+        """第attempt次重试前的等待时间（全抖动指数退避）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def sleep_backoff(self, attempt):
+        with self._lock:
+            self.retries += 1
+        time.sleep(self.backoff(attempt))
+
+    def call(self, func, *args, retries=1, **kwargs):
+        """限速调用func，失败时退避重试，最后一次失败时抛出异常"""
+        for attempt in range(retries):
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self.on_error(e)
+                if attempt < retries - 1:
+                    print(f"请求失败，重试 {attempt + 1}/{retries}: {str(e)}")
+                    self.sleep_backoff(attempt)
+                    continue
+                raise
+            self.on_success()
+            return result
+
+    def metrics(self):
+        """当前速率和计数"""
+        with self._lock:
+            return {
+                'rate': round(self.rate, 2),
+                'requests': self.requests,
+                'successes': self.successes,
+                'errors': self.errors,
+                'connection_errors': self.connection_errors,
+                'retries': self.retries,
+            }
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多周期K线
+由本地日线生成周线、月线（与 stock_zh_a_hist period="weekly"/"monthly" 相同的列名），
+先计算每个周期的起始下标，再用 reduceat 向量化聚合，不需要额外下载。
+新日线到来时只重算最后一个周期及之后的部分。
+"""
+
+import numpy as np
+import pandas as pd
+
+TIMEFRAMES = ['daily', 'weekly', 'monthly']
+TIMEFRAME_LABELS = {'daily': "日线", 'weekly': "周线", 'monthly': "月线"}
+
+
+def period_keys(dates, timeframe):
+    """每根日线所属周期的键：周线为该周周一的日序号，月线为月序号"""
+    days = np.asarray(dates, dtype='datetime64[D]')
+    if timeframe == 'weekly':
+        day_numbers = days.astype(np.int64)
+        # 1970-01-01 是星期四，(日序号+3)%7 为星期几（周一为0）
+        return day_numbers - (day_numbers + 3) % 7
+    if timeframe == 'monthly':
+        return days.astype('datetime64[M]').astype(np.int64)
+    raise ValueError(f"不支持的周期: {timeframe}")
+
+
+def period_starts(keys):
+    """每个周期第一根日线的下标"""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+def aggregate(daily, starts):
+    """按周期起始下标聚合日线为OHLCV（日期取周期内最后一个交易日）"""
+    ends = np.r_[starts[1:], len(daily)] - 1
+    close = pd.to_numeric(daily['收盘'], errors='coerce').to_numpy(dtype=float)
+    data = {
+        '日期': daily['日期'].to_numpy()[ends],
+        '开盘': pd.to_numeric(daily['开盘'], errors='coerce').to_numpy(dtype=float)[starts],
+        '收盘': close[ends],
+        '最高': np.fmax.reduceat(pd.to_numeric(daily['最高'], errors='coerce').to_numpy(dtype=float), starts),
+        '最低': np.fmin.reduceat(pd.to_numeric(daily['最低'], errors='coerce').to_numpy(dtype=float), starts),
+    }
+    for col in ('成交量', '成交额'):
+        if col in daily.columns:
+            values = np.nan_to_num(pd.to_numeric(daily[col], errors='coerce').to_numpy(dtype=float))
+            data[col] = np.add.reduceat(values, starts)
+    return pd.DataFrame(data)
+
+
+def resample(daily, timeframe):
+    """把按日期排序的日线整体重采样为周线或月线"""
+    if timeframe == 'daily' or daily is None or daily.empty:
+        return daily
+    starts = period_starts(period_keys(daily['日期'].astype(str).str[:10].to_numpy(), timeframe))
+    return _with_change(aggregate(daily, starts))
+
+
+def _with_change(bars):
+    """补充涨跌额、涨跌幅列"""
+    prev = bars['收盘'].shift(1)
+    bars['涨跌额'] = bars['收盘'] - prev
+    bars['涨跌幅'] = (bars['收盘'] / prev - 1) * 100
+    return bars
+
+
+class Resampler:
+    """按股票缓存周线、月线，新日线到来时增量更新"""
+
+    def __init__(self):
+        self._cache = {}  # (代码, 周期) -> (日线行数, 最后一个周期的起始下标, 校验收盘价, 周期K线)
+
+    def update(self, code, daily, timeframe):
+        """返回该股票指定周期的K线（daily 需按日期升序）"""
+        if timeframe == 'daily':
+            return daily
+        daily = daily.reset_index(drop=True)
+        dates = daily['日期'].astype(str).str[:10].to_numpy()
+        close = pd.to_numeric(daily['收盘'], errors='coerce').to_numpy(dtype=float)
+        cached = self._cache.get((code, timeframe))
+
+        if cached is not None:
+            count, tail_start, check_close, bars = cached
+            # 历史部分未变化（行数不减少且复权价格一致）时，只重算最后一个周期之后的数据
+            if len(daily) >= count and tail_start < len(daily) and close[tail_start] == check_close:
+                tail = daily.iloc[tail_start:]
+                starts = period_starts(period_keys(dates[tail_start:], timeframe))
+                new_bars = aggregate(tail, starts)
+                bars = pd.concat([bars.iloc[:-1][new_bars.columns], new_bars], ignore_index=True)
+                last_start = tail_start + int(starts[-1])
+                bars = _with_change(bars)
+                self._cache[(code, timeframe)] = (len(daily), last_start, close[last_start], bars)
+                return bars
+
+        starts = period_starts(period_keys(dates, timeframe))
+        if len(starts) == 0:
+            return None
+        bars = _with_change(aggregate(daily, starts))
+        last_start = int(starts[-1])
+        self._cache[(code, timeframe)] = (len(daily), last_start, close[last_start], bars)
+        return bars
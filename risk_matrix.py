@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+自选股相关性与风险矩阵
+按日收益率维护滚动窗口内的累加和矩阵（成对有效样本数、Σx、Σx²、Σxy），
+每来一个交易日只做几次 N×N 的外积加减，不必每次按 O(N²·窗口) 重算；
+由累加和得到协方差、相关系数、个股波动率和组合波动率，并把高度相关的股票聚成组。
+
+停牌等缺失的收益率按成对样本处理：两只股票只用同时有数据的交易日计算相关性。
+"""
+
+from collections import deque
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252  # 年化使用的交易日数
+
+
+def close_tail(hist_data, depth):
+    """从日线中取最近 depth 根的(日期数组, 收盘价数组)，供 RiskModel.update 使用"""
+    tail = hist_data.iloc[-depth:]
+    dates = tail['日期'].astype(str).str[:10].to_numpy().astype('U10')
+    return dates, pd.to_numeric(tail['收盘'], errors='coerce').to_numpy(dtype=float)
+
+
+def align_closes(closes, depth):
+    """把各股票最近 depth 根收盘价按日期对齐为矩阵（行=日期，列=股票，缺失为NaN）。
+    直接用numpy按日期定位写入，比 pd.concat 数百个Series快一个数量级"""
+    tails = [(d[-depth:], v[-depth:]) for d, v in closes.values()]
+    dates = np.unique(np.concatenate([d for d, _ in tails]))[-depth:] if tails else np.array([], dtype='U10')
+    prices = np.full((len(dates), len(tails)), np.nan)
+    for j, (tail_dates, values) in enumerate(tails):
+        pos = np.searchsorted(dates, tail_dates)
+        ok = pos < len(dates)
+        ok[ok] = dates[pos[ok]] == tail_dates[ok]
+        prices[pos[ok], j] = values[ok]
+    return dates, prices
+
+
+class RollingCovariance:
+    """固定窗口的滚动协方差，新增、替换、移出一行都只做外积加减"""
+
+    def __init__(self, size, window):
+        self.size = size
+        self.window = window
+        self.rows = deque()  # [(收益率(缺失为0), 有效标记)]
+        self.count = np.zeros((size, size))  # 成对有效样本数
+        self.sum_x = np.zeros((size, size))  # sum_x[i, j] = Σ x_i（j 同时有效）
+        self.sum_xx = np.zeros((size, size))  # sum_xx[i, j] = Σ x_i²（j 同时有效）
+        self.sum_xy = np.zeros((size, size))  # Σ x_i·x_j
+        self._pushes = 0
+
+    def _apply(self, x, m, sign):
+        self.count += sign * np.outer(m, m)
+        self.sum_x += sign * np.outer(x, m)
+        self.sum_xx += sign * np.outer(x * x, m)
+        self.sum_xy += sign * np.outer(x, x)
+
+    @staticmethod
+    def _split(returns):
+        returns = np.asarray(returns, dtype=float)
+        valid = np.isfinite(returns)
+        return np.where(valid, returns, 0.0), valid.astype(float)
+
+    def push(self, returns):
+        """加入最新一个交易日的收益率（缺失为NaN），超出窗口的最早一行被移出"""
+        x, m = self._split(returns)
+        self.rows.append((x, m))
+        self._apply(x, m, 1)
+        if len(self.rows) > self.window:
+            old_x, old_m = self.rows.popleft()
+            self._apply(old_x, old_m, -1)
+        # 反复加减会累积浮点误差，每滚动一个窗口按保存的行精确重算一次
+        self._pushes += 1
+        if self._pushes >= self.window:
+            self.rebuild()
+
+    def replace_last(self, returns):
+        """替换最后一行（盘中当天的K线仍在变化）"""
+        if not self.rows:
+            self.push(returns)
+            return
+        old_x, old_m = self.rows.pop()
+        self._apply(old_x, old_m, -1)
+        x, m = self._split(returns)
+        self.rows.append((x, m))
+        self._apply(x, m, 1)
+
+    def load(self, returns):
+        """一次性装入多行收益率（只保留最后 window 行），用矩阵乘法直接算累加和"""
+        self.rows = deque((self._split(row) for row in returns[-self.window:]))
+        self.rebuild()
+
+    def rebuild(self):
+        """按窗口内保存的行重新计算累加和"""
+        self._pushes = 0
+        if not self.rows:
+            for matrix in (self.count, self.sum_x, self.sum_xx, self.sum_xy):
+                matrix[:] = 0
+            return
+        x = np.vstack([r[0] for r in self.rows])
+        m = np.vstack([r[1] for r in self.rows])
+        self.count = m.T @ m
+        self.sum_x = x.T @ m
+        self.sum_xx = (x * x).T @ m
+        self.sum_xy = x.T @ x
+
+    def covariance(self, min_periods=2):
+        """成对样本协方差矩阵，样本不足的位置为NaN"""
+        n = np.where(self.count >= max(min_periods, 2), self.count, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self.sum_xy - self.sum_x * self.sum_x.T / n) / (n - 1)
+
+    def correlation(self, min_periods=2):
+        """成对样本相关系数矩阵"""
+        n = np.where(self.count >= max(min_periods, 2), self.count, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = (self.sum_xy - self.sum_x * self.sum_x.T / n) / (n - 1)
+            # 每一对各自在共同样本上的方差
+            var = np.maximum((self.sum_xx - self.sum_x * self.sum_x / n) / (n - 1), 0)
+            corr = cov / np.sqrt(var * var.T)
+        corr = np.clip(corr, -1, 1)
+        diag = np.diagonal(var).copy()
+        np.fill_diagonal(corr, np.where(diag > 0, 1.0, np.nan))
+        return corr
+
+
+class RiskModel:
+    """多个窗口的滚动风险矩阵，输入为各股票最近的（前复权）收盘价"""
+
+    def __init__(self, windows=(20, 60), min_periods=None):
+        self.windows = tuple(sorted(set(int(w) for w in windows)))
+        self.min_periods = min_periods
+        self.codes = []
+        self.trackers = {}
+        self.last_date = None
+
+    @property
+    def depth(self):
+        """每次更新需要的收盘价根数（最长窗口加一根用于计算收益率）"""
+        return self.windows[-1] + 1
+
+    def _min_periods(self, window):
+        return self.min_periods or max(window // 2, 2)
+
+    def reset(self, codes):
+        self.codes = list(codes)
+        self.trackers = {w: RollingCovariance(len(self.codes), w) for w in self.windows}
+        self.last_date = None
+
+    def update(self, closes):
+        """用 {代码: (日期数组, 收盘价数组)} 更新（见 close_tail），只有新交易日会被加入窗口，返回加入的天数"""
+        codes = list(closes)
+        if codes != self.codes:
+            # 股票集合变化时重建（只需最近 depth 根K线）
+            self.reset(codes)
+        if not codes:
+            return 0
+
+        dates, prices = align_closes(closes, self.depth + 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = prices[1:] / prices[:-1] - 1
+        dates = dates[1:]
+
+        if self.last_date is None:
+            # 首次装入整段历史
+            for tracker in self.trackers.values():
+                tracker.load(returns)
+            self.last_date = dates[-1] if len(dates) else None
+            return len(dates)
+
+        added = 0
+        for date, row in zip(dates, returns):
+            if date < self.last_date:
+                continue
+            for tracker in self.trackers.values():
+                if date == self.last_date:
+                    tracker.replace_last(row)
+                else:
+                    tracker.push(row)
+            if date != self.last_date:
+                added += 1
+            self.last_date = date
+        return added
+
+    def correlation(self, window):
+        """相关系数矩阵（DataFrame）"""
+        corr = self.trackers[window].correlation(self._min_periods(window))
+        return pd.DataFrame(corr, index=self.codes, columns=self.codes)
+
+    def covariance(self, window):
+        """协方差矩阵（DataFrame，日收益率）"""
+        cov = self.trackers[window].covariance(self._min_periods(window))
+        return pd.DataFrame(cov, index=self.codes, columns=self.codes)
+
+    def volatility(self, window):
+        """个股年化波动率（Series）"""
+        cov = self.trackers[window].covariance(self._min_periods(window))
+        vol = np.sqrt(np.maximum(np.diagonal(cov), 0) * TRADING_DAYS)
+        return pd.Series(vol, index=self.codes)
+
+    def portfolio_volatility(self, window, weights=None):
+        """组合年化波动率；weights 为 {代码: 权重}，默认等权。返回(波动率, 覆盖的权重比例)"""
+        if not self.codes:
+            return None, 0.0
+        if weights is None:
+            w = np.ones(len(self.codes))
+        else:
+            w = np.array([float(weights.get(c, 0.0)) for c in self.codes])
+        total = sum(abs(float(v)) for v in weights.values()) if weights is not None else w.sum()
+        cov = self.trackers[window].covariance(self._min_periods(window))
+        # 没有方差的股票不计入组合，缺少共同样本的股票对按不相关处理
+        has_var = np.isfinite(np.diagonal(cov))
+        w = np.where(has_var, w, 0.0)
+        if total == 0 or not w.any():
+            return None, 0.0
+        coverage = np.abs(w).sum() / total
+        w = w / np.abs(w).sum()
+        variance = w @ np.nan_to_num(cov) @ w
+        return float(np.sqrt(max(variance, 0) * TRADING_DAYS)), float(coverage)
+
+    def clusters(self, window, threshold=0.8, min_size=2):
+        """把高度相关的股票分组：反复选出相关系数≥threshold的邻居最多的股票，与其未分组的邻居组成一组
+        （组内每只股票都与中心股票高度相关，避免单链接的链式效应）。返回[{center, codes, avg_corr}]"""
+        corr = self.trackers[window].correlation(self._min_periods(window))
+        adjacent = np.nan_to_num(corr, nan=-1.0) >= threshold
+        np.fill_diagonal(adjacent, False)
+        free = np.ones(len(self.codes), dtype=bool)
+        groups = []
+        while True:
+            degree = (adjacent & free).sum(axis=1)
+            degree[~free] = -1
+            center = int(np.argmax(degree)) if len(degree) else 0
+            if len(degree) == 0 or degree[center] + 1 < min_size:
+                break
+            members = np.r_[center, np.flatnonzero(adjacent[center] & free)]
+            free[members] = False
+            sub = corr[np.ix_(members, members)]
+            off_diag = sub[~np.eye(len(members), dtype=bool)]
+            groups.append({
+                'center': self.codes[center],
+                'codes': [self.codes[i] for i in members],
+                'avg_corr': float(np.nanmean(off_diag)),
+            })
+        return groups
+
+    def top_pairs(self, window, count=10):
+        """相关性最高的股票对 [(代码1, 代码2, 相关系数)]"""
+        corr = self.trackers[window].correlation(self._min_periods(window))
+        rows, cols = np.triu_indices(len(self.codes), 1)
+        values = corr[rows, cols]
+        valid = np.isfinite(values)
+        rows, cols, values = rows[valid], cols[valid], values[valid]
+        order = np.argsort(-values)[:count]
+        return [(self.codes[rows[k]], self.codes[cols[k]], float(values[k])) for k in order]
+
+    def summary(self, window, weights=None, threshold=0.8):
+        """供界面和HTTP接口使用的摘要"""
+        equal_vol, _ = self.portfolio_volatility(window)
+        summary = {
+            'window': window,
+            'as_of': self.last_date,
+            'symbols': len(self.codes),
+            'equal_weight_volatility': equal_vol,
+            'clusters': self.clusters(window, threshold),
+            'top_pairs': self.top_pairs(window),
+        }
+        if weights:
+            vol, coverage = self.portfolio_volatility(window, weights)
+            summary['portfolio_volatility'] = vol
+            summary['portfolio_coverage'] = coverage
+        return summary
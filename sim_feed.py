@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+模拟行情源
+用假时钟驱动的随机游走生成全市场实时行情和日线，接口名称、参数和返回列名与程序用到的
+akshare 函数一致，可直接替换 akshare 传给 StockTrader(feed=...)，用于界面和刷新流程的压力测试。
+
+    clock = FakeClock(speed=60)            # 模拟时间以60倍速前进
+    market = SimulatedMarket(symbols=5000, clock=clock)
+    market.stock_zh_a_spot_em()            # 与 ak.stock_zh_a_spot_em() 列名相同
+
+规则：工作日为交易日，9:30-15:00 连续交易（不区分午休），价格保留两位小数，不发生除权除息；
+可设置每次请求的延迟和失败比例（抛出 ConnectionError）。
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+SESSION_OPEN = (9, 30)
+SESSION_CLOSE = (15, 0)
+SESSION_SECONDS = 5.5 * 3600
+
+INDUSTRIES = ['银行', '证券', '保险', '半导体', '软件开发', '医疗器械', '化学制药', '白酒',
+              '汽车整车', '电池', '光伏设备', '电力行业', '房地产开发', '工程建设', '煤炭行业', '通信设备']
+
+# (代码前缀, 数量占比)：沪市主板、深市主板、创业板、科创板、北交所
+BOARD_MIX = [('60', 0.33), ('00', 0.30), ('30', 0.25), ('68', 0.10), ('83', 0.02)]
+
+SPOT_COLUMNS = ['序号', '代码', '名称', '最新价', '涨跌幅', '涨跌额', '成交量', '成交额', '振幅', '最高', '最低',
+                '今开', '昨收', '量比', '换手率', '市盈率-动态', '市净率', '总市值', '流通市值', '涨速',
+                '5分钟涨跌', '60日涨跌幅', '年初至今涨跌幅']
+
+
+class FakeClock:
+    """模拟时钟：从 start 开始按 speed 倍速随真实时间前进，也可手动 advance"""
+
+    def __init__(self, start=None, speed=1.0):
+        if start is None:
+            # 默认从最近一个工作日的开盘时刻开始
+            start = datetime.now().replace(hour=SESSION_OPEN[0], minute=SESSION_OPEN[1], second=0, microsecond=0)
+            while start.weekday() >= 5:
+                start -= timedelta(days=1)
+        self.start = start
+        self.speed = speed
+        self._origin = time.monotonic()
+        self._offset = 0.0
+
+    def now(self):
+        return self.start + timedelta(seconds=(time.monotonic() - self._origin) * self.speed + self._offset)
+
+    def advance(self, seconds):
+        """手动拨快模拟时间"""
+        self._offset += seconds
+
+
+def trading_days(end, count):
+    """end（不含）之前的 count 个工作日"""
+    days = []
+    day = end
+    while len(days) < count:
+        day -= timedelta(days=1)
+        if day.weekday() < 5:
+            days.append(day)
+    return days[::-1]
+
+
+def session_seconds(moment):
+    """当天已交易的秒数（0 ~ SESSION_SECONDS）"""
+    opened = moment.replace(hour=SESSION_OPEN[0], minute=SESSION_OPEN[1], second=0, microsecond=0)
+    return min(max((moment - opened).total_seconds(), 0.0), SESSION_SECONDS)
+
+
+def make_codes(count, rng):
+    """按板块比例生成不重复的股票代码"""
+    codes = []
+    for prefix, share in BOARD_MIX:
+        n = max(1, int(round(count * share)))
+        numbers = rng.choice(10000, size=min(n, 10000), replace=False)
+        codes.extend(f"{prefix}{k:04d}" for k in np.sort(numbers))
+    return codes[:count]
+
+
+class SimulatedMarket:
+    """模拟全市场行情（线程安全）"""
+
+    def __init__(self, symbols=5000, clock=None, history_days=300, seed=0, volatility=0.02,
+                 latency=0.0, error_rate=0.0, request_rate=1000.0):
+        self.clock = clock or FakeClock()
+        self.volatility = volatility  # 日波动率
+        self.latency = latency  # 每次请求的延迟（秒）
+        self.error_rate = error_rate  # 请求失败比例
+        self.request_rate = request_rate  # 建议的请求速率上限（每秒）
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+        self._error_rng = random.Random(seed)
+
+        self.codes = make_codes(symbols, self._rng)
+        n = len(self.codes)
+        self._index = {code: i for i, code in enumerate(self.codes)}
+        self.names = [f"模拟{i:04d}" for i in range(n)]
+        self.industries = [INDUSTRIES[i % len(INDUSTRIES)] for i in range(n)]
+        self._shares = self._rng.uniform(1e8, 5e9, n).round(-4)  # 流通股本
+
+        # 历史日线：按行业共同因子 + 个股噪声的随机游走生成
+        today = self.clock.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        days = trading_days(today, history_days)
+        beta = self._rng.uniform(0.5, 1.5, n)
+        industry_id = np.arange(n) % len(INDUSTRIES)
+        factor = self._rng.standard_normal((len(days), len(INDUSTRIES))) * volatility * 0.6
+        noise = self._rng.standard_normal((len(days), n)) * volatility * 0.8
+        returns = np.clip(factor[:, industry_id] * beta + noise, -0.095, 0.095)
+        close = np.round(self._rng.uniform(3, 80, n) * np.cumprod(1 + returns, axis=0), 2)
+        close = np.maximum(close, 0.01)
+        prev = np.vstack([close[:1] / (1 + returns[:1]), close[:-1]]).round(2)
+        spread = np.abs(self._rng.standard_normal((len(days), n))) * volatility * 0.5
+        self._bars = {
+            'date': [d.strftime("%Y-%m-%d") for d in days],
+            'open': np.round(prev * (1 + self._rng.standard_normal((len(days), n)) * volatility * 0.3), 2),
+            'close': close,
+            'prev': prev,
+            'spread': spread,
+            'volume': np.round(self._rng.uniform(1e4, 1e6, (len(days), n))),
+        }
+        self._start_day(today, close[-1])
+
+    # ---- 内部状态 ----
+
+    def _start_day(self, day, prev_close):
+        """开始新的交易日"""
+        self._day = day
+        self._prev_close = prev_close.copy()
+        gap = self._rng.standard_normal(len(prev_close)) * self.volatility * 0.3
+        self._open = np.maximum(np.round(prev_close * (1 + gap), 2), 0.01)
+        self._price = self._open.copy()
+        self._high = self._open.copy()
+        self._low = self._open.copy()
+        self._volume = np.zeros(len(prev_close))
+        self._elapsed = 0.0  # 当天已模拟的交易秒数
+
+    def _close_day(self):
+        """把当天收盘数据并入历史日线"""
+        bars = self._bars
+        bars['date'].append(self._day.strftime("%Y-%m-%d"))
+        bars['open'] = np.vstack([bars['open'], self._open])
+        bars['close'] = np.vstack([bars['close'], self._price])
+        bars['prev'] = np.vstack([bars['prev'], self._prev_close])
+        spread = (self._high - self._low) / np.maximum(self._prev_close, 0.01)
+        bars['spread'] = np.vstack([bars['spread'], spread])
+        bars['volume'] = np.vstack([bars['volume'], self._volume])
+
+    def _advance(self):
+        """把行情推进到假时钟的当前时刻"""
+        now = self.clock.now()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        while self._day < today:
+            self._step(SESSION_SECONDS - self._elapsed)
+            if self._day.weekday() < 5:
+                self._close_day()
+                prev_close = self._price
+            else:
+                prev_close = self._prev_close
+            self._start_day(self._day + timedelta(days=1), prev_close)
+        if today.weekday() < 5:
+            self._step(session_seconds(now) - self._elapsed)
+
+    def _step(self, seconds):
+        """按交易秒数推进随机游走，价格限制在涨跌停范围内"""
+        if seconds <= 0 or self._day.weekday() >= 5:
+            return
+        self._elapsed += seconds
+        n = len(self._price)
+        sigma = self.volatility * np.sqrt(seconds / SESSION_SECONDS)
+        price = self._price * (1 + self._rng.standard_normal(n) * sigma)
+        price = np.clip(price, self._prev_close * 0.9, self._prev_close * 1.1)
+        self._price = np.maximum(np.round(price, 2), 0.01)
+        self._high = np.maximum(self._high, self._price)
+        self._low = np.minimum(self._low, self._price)
+        self._volume += np.round(self._rng.uniform(0, 2e3, n) * seconds / 60)
+
+    def _request(self):
+        """模拟请求延迟和失败"""
+        with self._lock:
+            self.requests += 1
+            fail = self._error_rng.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ConnectionError("Connection aborted (simulated)")
+
+    def _position(self, symbol):
+        index = self._index.get(str(symbol).zfill(6))
+        if index is None:
+            raise KeyError(f"模拟行情中没有股票 {symbol}")
+        return index
+
+    # ---- akshare 兼容接口 ----
+
+    def stock_zh_a_spot_em(self):
+        """全市场实时行情"""
+        self._request()
+        with self._lock:
+            self._advance()
+            price, prev = self._price.copy(), self._prev_close
+            high, low, open_, volume = self._high.copy(), self._low.copy(), self._open, self._volume.copy()
+        change = np.round(price - prev, 2)
+        amount = np.round(volume * 100 * (high + low) / 2, 2)
+        market_value = price * self._shares
+        n = len(price)
+        return pd.DataFrame({
+            '序号': np.arange(1, n + 1),
+            '代码': self.codes,
+            '名称': self.names,
+            '最新价': price,
+            '涨跌幅': np.round(change / prev * 100, 2),
+            '涨跌额': change,
+            '成交量': volume,
+            '成交额': amount,
+            '振幅': np.round((high - low) / prev * 100, 2),
+            '最高': high,
+            '最低': low,
+            '今开': open_,
+            '昨收': prev,
+            '量比': np.round(self._rng.uniform(0.5, 2.0, n), 2),
+            '换手率': np.round(volume * 100 / self._shares * 100, 2),
+            '市盈率-动态': np.round(self._rng.uniform(5, 80, n), 2),
+            '市净率': np.round(self._rng.uniform(0.5, 8, n), 2),
+            '总市值': np.round(market_value * 1.2),
+            '流通市值': np.round(market_value),
+            '涨速': 0.0,
+            '5分钟涨跌': 0.0,
+            '60日涨跌幅': 0.0,
+            '年初至今涨跌幅': 0.0,
+        }, columns=SPOT_COLUMNS)
+
+    def stock_zh_a_hist(self, symbol="000001", period="daily", start_date="19700101", end_date="20500101",
+                        adjust=""):
+        """个股日线（交易时段内包含当天未完成的K线）；模拟数据没有除权，adjust 不影响结果"""
+        self._request()
+        i = self._position(symbol)
+        with self._lock:
+            self._advance()
+            bars = self._bars
+            dates = list(bars['date'])
+            close = bars['close'][:, i]
+            open_, prev = bars['open'][:, i], bars['prev'][:, i]
+            spread, volume = bars['spread'][:, i], bars['volume'][:, i]
+            if self._day.weekday() < 5 and self._elapsed > 0:
+                dates.append(self._day.strftime("%Y-%m-%d"))
+                close = np.append(close, self._price[i])
+                open_ = np.append(open_, self._open[i])
+                prev = np.append(prev, self._prev_close[i])
+                spread = np.append(spread, (self._high[i] - self._low[i]) / self._prev_close[i])
+                volume = np.append(volume, self._volume[i])
+        high = np.round(np.maximum(np.maximum(open_, close), prev * (1 + spread / 2)), 2)
+        low = np.round(np.minimum(np.minimum(open_, close), prev * (1 - spread / 2)), 2)
+        change = np.round(close - prev, 2)
+        data = pd.DataFrame({
+            '日期': dates,
+            '股票代码': self.codes[i],
+            '开盘': open_,
+            '收盘': close,
+            '最高': high,
+            '最低': low,
+            '成交量': volume,
+            '成交额': np.round(volume * 100 * close, 2),
+            '振幅': np.round((high - low) / prev * 100, 2),
+            '涨跌幅': np.round(change / prev * 100, 2),
+            '涨跌额': change,
+            '换手率': np.round(volume * 100 / self._shares[i] * 100, 2),
+        })
+        start = f"{start_date[:4]}-{start_date[4:6]}-{start_date[6:8]}"
+        end = f"{end_date[:4]}-{end_date[4:6]}-{end_date[6:8]}"
+        data = data[(data['日期'] >= start) & (data['日期'] <= end)].reset_index(drop=True)
+        if period != 'daily':
+            from resample import resample
+            data = resample(data, period)
+        return data
+
+    def stock_individual_info_em(self, symbol="000001"):
+        """个股基本信息（item/value 两列）"""
+        self._request()
+        i = self._position(symbol)
+        price = float(self._price[i])
+        return pd.DataFrame({
+            'item': ['最新', '股票代码', '股票简称', '总股本', '流通股', '总市值', '流通市值', '行业', '上市时间'],
+            'value': [price, self.codes[i], self.names[i], self._shares[i] * 1.2, self._shares[i],
+                      price * self._shares[i] * 1.2, price * self._shares[i], self.industries[i],
+                      self._bars['date'][0].replace('-', '')],
+        })
+
+    def _listing(self, prefixes, code_col, name_col, date_col):
+        self._request()
+        rows = [(c, self.names[i]) for i, c in enumerate(self.codes) if c[:2] in prefixes]
+        return pd.DataFrame({
+            code_col: [c for c, _ in rows],
+            name_col: [n for _, n in rows],
+            date_col: self._bars['date'][0],
+        })
+
+    def stock_info_sh_name_code(self, symbol="主板A股"):
+        prefixes = ('68',) if symbol == "科创板" else ('60',)
+        return self._listing(prefixes, '证券代码', '证券简称', '上市日期')
+
+    def stock_info_sz_name_code(self, symbol="A股列表"):
+        return self._listing(('00', '30'), 'A股代码', 'A股简称', 'A股上市日期')
+
+    def stock_info_bj_name_code(self):
+        return self._listing(('83',), '证券代码', '证券简称', '上市日期')
+
+    def _average_index(self, members, base, start_date):
+        """成员股票收盘价的等权指数日线"""
+        with self._lock:
+            self._advance()
+            close = self._bars['close'][:, members]
+            dates = list(self._bars['date'])
+            if self._day.weekday() < 5 and self._elapsed > 0:
+                close = np.vstack([close, self._price[members]])
+                dates.append(self._day.strftime("%Y-%m-%d"))
+        level = np.round(base * (close / close[0]).mean(axis=1), 2)
+        data = pd.DataFrame({'日期': dates, '开盘': level, '收盘': level, '最高': level, '最低': level,
+                             '成交量': 0.0, '成交额': 0.0})
+        start = f"{start_date[:4]}-{start_date[4:6]}-{start_date[6:8]}"
+        return data[data['日期'] >= start].reset_index(drop=True)
+
+    def index_zh_a_hist(self, symbol="000300", period="daily", start_date="19700101", end_date="22220101"):
+        """指数日线：全部模拟股票的等权指数"""
+        self._request()
+        return self._average_index(np.arange(len(self.codes)), 4000.0, start_date)
+
+    def stock_board_industry_hist_em(self, symbol="银行", start_date="20211201", end_date="20220401",
+                                     period="日k", adjust=""):
+        """行业板块日线：该行业模拟股票的等权指数"""
+        self._request()
+        members = np.flatnonzero(np.array(self.industries) == symbol)
+        if len(members) == 0:
+            raise KeyError(f"模拟行情中没有行业 {symbol}")
+        return self._average_index(members, 1000.0, start_date)
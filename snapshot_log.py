@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+盘中行情快照增量日志
+保留上一份全市场行情快照（stock_zh_a_spot_em），每次只把发生变化的行追加写入
+当日的二进制日志 snapshots/YYYYMMDD.bin；回放接口可重建任意时刻的全市场行情。
+
+文件格式（小端）：由若干条记录依次组成，每条记录为
+    记录头: 魔数 b'SNAP' + 时间戳(float64, Unix秒) + 行数(uint32)
+    行数据: 行数 × ROW_DTYPE（代码6字节 + 各字段float64）
+每天的第一条记录包含全部股票，之后只包含变化的行。
+"""
+
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+MAGIC = b'SNAP'
+HEADER = struct.Struct('<4sdI')
+
+# 记录的字段：(字段名, stock_zh_a_spot_em 列名)
+FIELDS = [
+    ('price', '最新价'),
+    ('pct', '涨跌幅'),
+    ('change', '涨跌额'),
+    ('volume', '成交量'),
+    ('amount', '成交额'),
+    ('high', '最高'),
+    ('low', '最低'),
+    ('open', '今开'),
+    ('prev_close', '昨收'),
+    ('turnover', '换手率'),
+]
+ROW_DTYPE = np.dtype([('code', 'S6')] + [(name, '<f8') for name, _ in FIELDS])
+
+
+def snapshot_to_rows(snapshot):
+    """把行情快照转换为按代码排序的结构化数组"""
+    rows = np.zeros(len(snapshot), dtype=ROW_DTYPE)
+    rows['code'] = snapshot['代码'].astype(str).str.zfill(6).str.encode('ascii').values
+    for name, column in FIELDS:
+        if column in snapshot.columns:
+            rows[name] = pd.to_numeric(snapshot[column], errors='coerce').to_numpy(dtype=float)
+        else:
+            rows[name] = np.nan
+    rows = rows[np.argsort(rows['code'], kind='stable')]
+    # 去掉重复代码（保留最后一条）
+    keep = np.append(rows['code'][1:] != rows['code'][:-1], True) if len(rows) else np.zeros(0, dtype=bool)
+    return rows[keep]
+
+
+def rows_to_frame(rows):
+    """把结构化数组转换回 akshare 列名的DataFrame"""
+    data = {'代码': rows['code'].astype(str)}
+    for name, column in FIELDS:
+        data[column] = rows[name]
+    return pd.DataFrame(data)
+
+
+def diff_rows(prev, new):
+    """返回 new 中相对 prev 新增或变化的行（两者均按代码排序）"""
+    if prev is None or len(prev) == 0:
+        return new
+    pos = np.searchsorted(prev['code'], new['code'])
+    pos_clipped = np.minimum(pos, len(prev) - 1)
+    matched = prev['code'][pos_clipped] == new['code']
+    old = prev[pos_clipped]
+    changed = ~matched
+    for name, _ in FIELDS:
+        a, b = old[name], new[name]
+        # NaN与NaN视为相同
+        changed |= ~((a == b) | (np.isnan(a) & np.isnan(b)))
+    return new[changed]
+
+
+def merge_rows(state, delta):
+    """把增量行合并到状态中（按代码更新或插入），返回新的状态"""
+    if state is None or len(state) == 0:
+        return delta.copy()
+    if len(delta) == 0:
+        return state
+    pos = np.searchsorted(state['code'], delta['code'])
+    pos_clipped = np.minimum(pos, len(state) - 1)
+    matched = state['code'][pos_clipped] == delta['code']
+    state = state.copy()
+    state[pos_clipped[matched]] = delta[matched]
+    if (~matched).any():
+        state = np.concatenate([state, delta[~matched]])
+        state = state[np.argsort(state['code'], kind='stable')]
+    return state
+
+
+def iter_records(path):
+    """依次读取日志中的记录，返回(时间戳, 行数组)；末尾不完整的记录会被忽略"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        magic, ts, count = HEADER.unpack_from(data, offset)
+        if magic != MAGIC:
+            print(f"快照日志损坏: {path} 偏移 {offset}")
+            return
+        start = offset + HEADER.size
+        end = start + count * ROW_DTYPE.itemsize
+        if end > len(data):
+            return
+        yield ts, np.frombuffer(data, dtype=ROW_DTYPE, count=count, offset=start)
+        offset = end
+
+
+class SnapshotLog:
+    """按交易日分文件的增量快照日志（可从多个刷新线程同时写入）"""
+
+    def __init__(self, directory="snapshots"):
+        self.directory = directory
+        self._lock = threading.Lock()  # 保证上一份快照、差分和文件追加作为一个整体执行
+        self._date = None
+        self._prev = None
+        self._last_ts = None
+
+    def path(self, date):
+        return os.path.join(self.directory, f"{date}.bin")
+
+    def append(self, snapshot, timestamp=None):
+        """写入一份新快照中变化的行，返回写入的行数"""
+        if snapshot is None or snapshot.empty:
+            return 0
+        timestamp = timestamp or time.time()
+        date = datetime.fromtimestamp(timestamp).strftime("%Y%m%d")
+        rows = snapshot_to_rows(snapshot)
+        with self._lock:
+            if date != self._date:
+                # 新的一天或程序重启：从当日已有日志恢复上一份快照
+                self._date = date
+                self._prev = self._replay_rows(date) if os.path.exists(self.path(date)) else None
+                self._last_ts = None
+            if self._last_ts is not None and timestamp < self._last_ts:
+                # 另一个线程已写入更新的快照，回放要求记录按时间递增，较旧的快照不再记录
+                return 0
+
+            delta = diff_rows(self._prev, rows)
+            self._prev = merge_rows(self._prev, rows) if self._prev is not None else rows
+            if len(delta) == 0:
+                return 0
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self.path(date), 'ab') as f:
+                    # 记录头和数据一次写入
+                    f.write(HEADER.pack(MAGIC, timestamp, len(delta)) + delta.tobytes())
+            except Exception as e:
+                print(f"写入快照日志失败: {str(e)}")
+                return 0
+            self._last_ts = timestamp
+            return len(delta)
+
+    def _replay_rows(self, date, until=None):
+        state = None
+        for ts, delta in iter_records(self.path(date)):
+            if until is not None and ts > until:
+                break
+            state = merge_rows(state, delta)
+        return state
+
+    def replay(self, timestamp):
+        """重建指定时刻（Unix秒或datetime）的全市场行情，返回DataFrame；没有数据时返回None"""
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.timestamp()
+        date = datetime.fromtimestamp(timestamp).strftime("%Y%m%d")
+        if not os.path.exists(self.path(date)):
+            return None
+        state = self._replay_rows(date, until=timestamp)
+        return rows_to_frame(state) if state is not None else None
+
+    def timestamps(self, date):
+        """当日所有记录的时间戳"""
+        if not os.path.exists(self.path(date)):
+            return []
+        return [ts for ts, _ in iter_records(self.path(date))]
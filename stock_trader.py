@@ -7,21 +7,40 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
+import argparse
 import json
+import math
 import os
 import threading
 import time
+from collections import deque
 from datetime import datetime, timedelta
-import akshare as ak
+import ak_lite as ak  # 只按需加载用到的akshare子模块
 import pandas as pd
 import numpy as np
+from symbol_master import SymbolMaster, get_exchange_board
+from portfolio import Portfolio
+from advice import (AdviceParams, AdviceCode, ADVICE_LABELS, score_batch, stack_indicators, format_advice,
+                    indicator_names, screen)
+from history_store import HistoryStore, apply_factors
+from api_server import SnapshotHub, start_server
+from rate_limiter import RateController
+from profiler import profile_call, profiling_requested
+from snapshot_log import SnapshotLog
+from resample import Resampler, TIMEFRAMES, TIMEFRAME_LABELS
+from risk_matrix import RiskModel, close_tail
+from benchmark import BenchmarkStore, BENCHMARKS, relative_strength
+from app_state import StateStore
+from atomic_file import atomic_write_json
+from data_quality import QualityGate, quality_names
 
 # 版本号
 VERSION = "1.0.0"
 
 
 class StockTrader:
-    def __init__(self, root):
+    def __init__(self, root, api_port=None, api_host="127.0.0.1", refresh_interval=None, profile=False,
+                 risk_windows=(20, 60), benchmark="000300", industry_rs=False, feed=None, screen_min_rs=None):
         self.root = root
         self.root.title(f"股票交易助手 v{VERSION}")
         self.root.geometry("900x600")
@@ -29,23 +48,140 @@ class StockTrader:
         # 自选股票列表文件
         self.stock_file = "watchlist.json"
         
-        # 加载自选股票列表
-        self.watchlist = self.load_watchlist()
+        # 共享状态：自选列表、股票数据和全市场行情快照（写时复制，界面线程和刷新线程读取均无需加锁）
+        self.state = StateStore(self.load_watchlist())
         
-        # 股票数据缓存
-        self.stock_data = {}
-        
-        # 全局股票数据缓存（避免频繁请求）
-        self.all_stocks_cache = None
-        self.cache_time = None
+        # 全市场行情快照缓存时间（避免频繁请求）
         self.cache_timeout = 60  # 缓存60秒
         
+        # 盘中行情增量日志（只记录与上一份快照相比变化的行，可回放任意时刻的行情）
+        self.snapshot_log = SnapshotLog("snapshots")
+        
+        # 行情数据源：默认为akshare，压力测试时可传入模拟行情（sim_feed.SimulatedMarket）
+        self.ak = feed if feed is not None else ak
+        
+        # 所有akshare请求共享的速率控制器（AIMD）
+        if feed is not None:
+            # 模拟行情按其设定的请求速率上限
+            self.rate_controller = RateController(initial_rate=feed.request_rate, max_rate=feed.request_rate)
+        else:
+            self.rate_controller = RateController()
+        
+        # 本地股票代码表（用于本地校验、名称查询和搜索）
+        self.symbol_master = SymbolMaster("symbol_master.json")
+        self.symbol_master.load()
+        
+        # 持仓（与自选列表保存在同一目录）
+        self.portfolio = Portfolio(os.path.join(os.path.dirname(self.stock_file), "portfolio.json"))
+        self.portfolio.load()
+        self.portfolio_result = None
+        self.portfolio_window = None
+        
+        # 交易建议参数（可由 advice_optimizer.py 搜索后保存到 advice_params.json）
+        self.advice_params = AdviceParams.load("advice_params.json")
+        
+        # 本地历史数据缓存（不复权日线+复权因子，增量下载，也供参数搜索等离线分析使用）
+        self.history_store = HistoryStore("history_cache")
+        # 周线、月线由本地日线重采样得到，列表默认显示日线建议
+        self.resampler = Resampler()
+        self.timeframe = 'daily'
+        
+        # 自选股相关性与风险矩阵（按交易日增量更新）
+        self.risk_model = RiskModel(windows=risk_windows)
+        # 代码 -> 最近的(日期, 收盘价)，供风险矩阵和相对强弱使用；写时复制后整体替换，读取方只取一次引用
+        self.recent_closes = {}
+        self._closes_lock = threading.Lock()
+        self.risk_summary = {}  # 窗口 -> 摘要
+        self.risk_window = None
+        
+        # 相对强弱的基准指数（默认沪深300）和可选的行业指数，日线缓存在本地，每天最多下载一次
+        self.benchmark_symbol = benchmark
+        self.industry_rs = industry_rs
+        self.screen_min_rs = screen_min_rs  # 选股结果要求的最低相对强弱（%），None 为不限制
+        self.benchmark_store = BenchmarkStore(os.path.join("history_cache", "benchmarks"))
+        
+        # 历史数据质量检查（结果按数据版本缓存，有新K线时才重新检查），最近的K线有严重问题时不评分
+        self.quality_gate = QualityGate(window=self.closes_depth())
+        
+        # 刷新状态（避免自动刷新与手动刷新重叠）
+        self.refreshing = False
+        self.refresh_interval = refresh_interval
+        self.refresh_skipped = 0  # 因上一次刷新未完成而跳过的自动刷新次数
+        self.refresh_history = deque(maxlen=100)  # 最近的刷新耗时记录
+        
+        # 后台线程交给界面线程执行、尚未执行的更新数量
+        self.ui_pending = 0
+        self._ui_lock = threading.Lock()
+        
+        # 性能分析：只分析开启后的下一次刷新
+        self.profile_next_refresh = profile
+        
+        # HTTP接口：所有客户端共享同一份快照，请求不会触发上游数据获取
+        self.api_hub = None
+        if api_port:
+            self.api_hub = SnapshotHub(max_age=min(refresh_interval or 60, 60))
+            start_server(self.api_hub, api_host, api_port)
+        
         # 创建界面
         self.create_widgets()
         
         # 如果已有自选股票，自动加载显示
         if self.watchlist:
             self.display_stocks()
+        
+        # 代码表过期时在后台刷新
+        if self.symbol_master.is_stale():
+            threading.Thread(target=self._refresh_symbol_master_thread, daemon=True).start()
+        
+        self.publish_snapshot()
+        
+        # 定时自动刷新
+        if self.refresh_interval:
+            self.root.after(1000, self.auto_refresh)
+    
+    def _refresh_symbol_master_thread(self):
+        """后台刷新本地股票代码表"""
+        stock_data = self.get_all_stocks_data()
+        if stock_data is None or not self.symbol_master.is_stale():
+            return
+        self.refresh_symbol_master(stock_data)
+    
+    def refresh_symbol_master(self, stock_data):
+        """由实时行情快照重建代码表，并尽量补充上市日期"""
+        if not self.symbol_master.build_from_snapshot(stock_data):
+            return
+        # 上市日期不在行情快照中，从交易所证券列表补充（失败不影响代码表）
+        for fetch in [
+            lambda: self.rate_controller.call(self.ak.stock_info_sh_name_code, symbol="主板A股"),
+            lambda: self.rate_controller.call(self.ak.stock_info_sh_name_code, symbol="科创板"),
+            lambda: self.rate_controller.call(self.ak.stock_info_sz_name_code, symbol="A股列表"),
+            lambda: self.rate_controller.call(self.ak.stock_info_bj_name_code),
+        ]:
+            try:
+                self.symbol_master.update_listing_dates(fetch())
+            except Exception as e:
+                print(f"获取上市日期失败: {str(e)}")
+        self.symbol_master.save()
+        print(f"股票代码表已刷新，共 {len(self.symbol_master)} 只股票")
+    
+    @property
+    def watchlist(self):
+        """当前自选列表（只读元组）"""
+        return self.state.current.watchlist
+    
+    @property
+    def stock_data(self):
+        """当前各股票数据（只读映射）"""
+        return self.state.current.stocks
+    
+    @property
+    def all_stocks_cache(self):
+        """最近一次获取的全市场行情快照"""
+        return self.state.current.market
+    
+    @property
+    def cache_time(self):
+        return self.state.current.market_time
     
     def load_watchlist(self):
         """从JSON文件加载自选股票列表"""
@@ -58,10 +194,9 @@ class StockTrader:
         return []
     
     def save_watchlist(self):
-        """保存自选股票列表到JSON文件"""
+        """保存自选股票列表到JSON文件（先写临时文件再替换，不会留下写了一半的文件）"""
         try:
-            with open(self.stock_file, 'w', encoding='utf-8') as f:
-                json.dump(self.watchlist, f, ensure_ascii=False, indent=2)
+            atomic_write_json(self.stock_file, list(self.watchlist))
         except Exception as e:
             messagebox.showerror("错误", f"保存失败: {str(e)}")
     
@@ -73,15 +208,28 @@ class StockTrader:
         
         ttk.Label(input_frame, text="股票代码:").pack(side=tk.LEFT, padx=5)
         
-        self.code_entry = ttk.Entry(input_frame, width=15)
+        # 支持输入代码、名称或拼音首字母，输入时从本地代码表给出候选
+        self.code_entry = ttk.Combobox(input_frame, width=20)
         self.code_entry.pack(side=tk.LEFT, padx=5)
         self.code_entry.bind('<Return>', lambda e: self.add_stock())
+        self.code_entry.bind('<KeyRelease>', self.update_suggestions)
         
         ttk.Button(input_frame, text="添加股票", command=self.add_stock).pack(side=tk.LEFT, padx=5)
         ttk.Button(input_frame, text="更新价格", command=self.update_prices).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="持仓", command=self.show_portfolio).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="风险", command=self.show_risk).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="导出", command=self.export_history).pack(side=tk.LEFT, padx=5)
+        
+        # 建议周期切换
+        ttk.Label(input_frame, text="周期:").pack(side=tk.LEFT, padx=5)
+        self.timeframe_box = ttk.Combobox(input_frame, width=6, state="readonly",
+                                          values=[TIMEFRAME_LABELS[tf] for tf in TIMEFRAMES])
+        self.timeframe_box.set(TIMEFRAME_LABELS[self.timeframe])
+        self.timeframe_box.pack(side=tk.LEFT, padx=5)
+        self.timeframe_box.bind('<<ComboboxSelected>>', self.change_timeframe)
         
         # 提示标签
-        self.status_label = ttk.Label(input_frame, text="请输入6位股票代码（如：000001、600000）", foreground="gray")
+        self.status_label = ttk.Label(input_frame, text="请输入6位股票代码、名称或拼音首字母（如：000001、PAYH）", foreground="gray")
         self.status_label.pack(side=tk.LEFT, padx=10)
         
         # 股票列表显示区域
@@ -111,7 +259,8 @@ class StockTrader:
         
         # 添加滚动条
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.configure(yscrollcommand=lambda first, last: self.on_tree_scroll(scrollbar, first, last))
+        self.rendered_rows = set()  # 已格式化显示的行
         
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -127,9 +276,31 @@ class StockTrader:
         if item:
             self.context_menu.post(event.x_root, event.y_root)
     
+    def update_suggestions(self, event=None):
+        """根据输入内容更新候选股票列表"""
+        if event is not None and event.keysym in ('Return', 'Up', 'Down', 'Escape'):
+            return
+        text = self.code_entry.get().strip()
+        codes = self.symbol_master.search(text) if text else []
+        self.code_entry['values'] = [f"{c} {self.symbol_master.get_name(c, '')}" for c in codes]
+    
+    def resolve_input(self, text):
+        """把输入（代码、候选项、名称或拼音首字母）解析为股票代码"""
+        # 候选项格式为"代码 名称"
+        token = text.split()[0] if text.split() else text
+        if token.isdigit():
+            return token
+        matches = self.symbol_master.search(token, limit=2)
+        for code in matches:
+            if self.symbol_master.get_name(code) == token:
+                return code
+        if len(matches) == 1:
+            return matches[0]
+        return token
+    
     def add_stock(self):
         """添加股票到自选列表"""
-        code = self.code_entry.get().strip()
+        code = self.resolve_input(self.code_entry.get().strip())
         
         if not code:
             messagebox.showwarning("警告", "请输入股票代码")
@@ -150,8 +321,10 @@ class StockTrader:
             messagebox.showerror("错误", f"股票代码 {code} 无效或不存在")
             return
         
-        # 添加到列表
-        self.watchlist.append(code)
+        # 添加到列表（刷新线程可能同时在运行，由状态对象保证不会重复添加）
+        if not self.state.add_code(code):
+            messagebox.showinfo("提示", f"股票 {code} 已在自选列表中")
+            return
         self.save_watchlist()
         
         # 清空输入框
@@ -160,14 +333,36 @@ class StockTrader:
         # 更新显示
         self.display_stocks()
         
-        # 自动获取一次价格
-        self.update_single_stock(code)
+        # 在后台线程获取一次价格（包含历史、基准等网络请求），避免界面卡顿
+        threading.Thread(target=self._add_stock_thread, args=(code,), daemon=True).start()
+        self.status_label.config(text=f"正在获取 {code} 的数据...", foreground="blue")
+    
+    def _add_stock_thread(self, code):
+        """获取新添加股票数据的线程函数"""
+        try:
+            if self.refresh_codes([code]):
+                status, color = f"已添加 {code}", "green"
+            else:
+                status, color = f"已添加 {code}，获取数据失败", "red"
+            self.publish_snapshot()
+        except Exception as e:
+            print(f"获取股票 {code} 数据失败: {str(e)}")
+            status, color = f"已添加 {code}，获取数据失败: {str(e)}", "red"
+        self.post_ui(self.display_stocks)
+        self.post_ui(lambda: self.status_label.config(text=status, foreground=color))
     
     def validate_stock_code(self, code):
         """验证股票代码是否有效"""
+        # 优先使用本地代码表，无需网络请求
+        if code in self.symbol_master:
+            return True
+        if not self.symbol_master.is_stale():
+            return False
+        
+        # 代码表不可用或已过期（可能是新上市股票），回退到网络校验
         try:
             # 尝试获取股票基本信息
-            stock_info = ak.stock_individual_info_em(symbol=code)
+            stock_info = self.rate_controller.call(self.ak.stock_individual_info_em, symbol=code)
             return stock_info is not None and not stock_info.empty
         except:
             return False
@@ -183,91 +378,626 @@ class StockTrader:
         code = values[0]
         
         if messagebox.askyesno("确认", f"确定要删除股票 {code} 吗？"):
-            if code in self.watchlist:
-                self.watchlist.remove(code)
+            if self.state.remove_code(code):
                 self.save_watchlist()
                 self.display_stocks()
+                self.publish_snapshot()
     
     def display_stocks(self):
-        """显示自选股票列表"""
+        """显示自选股票列表（先插入空行，只格式化可见行）"""
         # 清空现有显示
         for item in self.tree.get_children():
             self.tree.delete(item)
+        self.rendered_rows = set()
         
         # 显示所有自选股票
         for code in self.watchlist:
-            if code in self.stock_data:
-                data = self.stock_data[code]
-                name = data.get('name', code)
-                price = data.get('price', '--')
-                change_pct = data.get('change_pct', '--')
-                advice = data.get('advice', '--')
-                accuracy = data.get('accuracy', '--')
-                update_time = data.get('update_time', '--')
-            else:
-                name = code
-                price = '--'
-                change_pct = '--'
-                advice = '--'
-                accuracy = '--'
-                update_time = '--'
+            if not self.tree.exists(code):
+                self.tree.insert("", tk.END, iid=code, values=(code,))
+        
+        self.render_visible_rows()
+    
+    def on_tree_scroll(self, scrollbar, first, last):
+        """列表滚动时同步滚动条并格式化新出现的行"""
+        scrollbar.set(first, last)
+        self.render_visible_rows(float(first), float(last))
+    
+    def render_visible_rows(self, first=None, last=None):
+        """格式化当前可见的行"""
+        if first is None:
+            first, last = self.tree.yview()
+        items = self.tree.get_children()
+        start = int(first * len(items))
+        end = min(len(items), int(np.ceil(last * len(items))) + 1)
+        for item in items[start:end]:
+            if item not in self.rendered_rows:
+                self.tree.item(item, values=self.format_row(item))
+                self.rendered_rows.add(item)
+    
+    def format_row(self, code):
+        """把一只股票的数据格式化为列表中的一行"""
+        data = self.stock_data.get(code)
+        if data is None:
+            return (code, code, '--', '--', '--', '--', '--')
+        price = data.get('price')
+        change_pct = data.get('change_pct')
+        # 建议和准确性按当前选择的周期显示，涨跌幅在非日线周期下为本周期涨跌幅
+        result = data.get('results', {}).get(self.timeframe, data)
+        if self.timeframe != 'daily':
+            change_pct = data.get('timeframes', {}).get(self.timeframe, {}).get('change_pct')
+        advice = result.get('advice')
+        accuracy = result.get('accuracy')
+        update_time = data.get('update_time')
+        advice_text = format_advice(advice, result.get('mask', 0)) if advice is not None else "--"
+        if advice == AdviceCode.BAD_DATA:
+            advice_text = f"{advice_text} ({'、'.join(quality_names(data['quality']['blocking']))})"
+        return (
+            code,
+            data.get('name', code),
+            f"{price:.2f}" if price else "--",
+            f"{change_pct:.2f}" if change_pct is not None else "--",
+            advice_text,
+            f"{accuracy:.2f}" if accuracy is not None else "--",
+            update_time.strftime("%Y-%m-%d %H:%M:%S") if update_time else "--",
+        )
+    
+    def refresh_codes(self, codes):
+        """
+        获取、评分多只股票并一次性提交到共享状态，返回成功数量
+        新数据先写入本线程私有的字典，评分完成后整体合并，其他线程不会读到未评分的数据
+        """
+        batch = {}
+        success_count = 0
+        for code in codes:
+            if self.update_single_stock(code, batch):
+                success_count += 1
+        
+        # 相对基准的强弱（所有股票一次向量化计算），然后一次性评分
+        self.update_relative_strength(batch)
+        self.score_entries(batch)
+        self.state.put_stocks(batch)
+        return success_count
+    
+    def score_entries(self, batch):
+        """对一批尚未提交的股票数据一次性评分（日线、周线、月线各一批），写入得分、建议代码、指标位掩码和准确性"""
+        for timeframe in TIMEFRAMES:
+            entries, changes, indicators = [], [], []
+            for entry in batch.values():
+                # 获取失败的没有指标字段；没有可用历史数据的仍按涨跌幅评分，未通过质量检查的不评分
+                if 'indicators' not in entry or entry.get('advice') == AdviceCode.BAD_DATA:
+                    continue
+                if timeframe == 'daily':
+                    frame = entry
+                else:
+                    frame = entry.get('timeframes', {}).get(timeframe)
+                    if frame is None:
+                        continue
+                entries.append(entry)
+                changes.append(frame['change_pct'])
+                indicators.append(frame['indicators'])
+            if not entries:
+                continue
+            ind = stack_indicators([e['price'] for e in entries], changes, indicators)
+            score, advice, mask, accuracy = score_batch(ind, self.advice_params)
+            for i, entry in enumerate(entries):
+                result = {
+                    'score': float(score[i]),
+                    'advice': int(advice[i]),
+                    'mask': int(mask[i]),
+                    'accuracy': float(accuracy[i]),
+                }
+                entry['results'] = dict(entry.get('results', {}), **{timeframe: result})
+                if timeframe == 'daily':
+                    entry.update(result)
+    
+    def closes_depth(self):
+        """保留的最近收盘价根数：满足风险矩阵最长窗口和相对强弱回看期"""
+        return max(self.risk_model.depth + 1, int(self.advice_params.rs_lookback) + 2)
+    
+    def fetch_benchmark(self, key, fetch):
+        """获取（需要时下载）基准日线，请求经过速率控制器"""
+        return self.benchmark_store.refresh(key, lambda start: self.rate_controller.call(fetch, start, retries=2))
+    
+    def lookup_industry(self, code):
+        """查询个股所属行业（东方财富行业分类）"""
+        info = self.rate_controller.call(self.ak.stock_individual_info_em, symbol=code, retries=2)
+        row = info[info['item'] == '行业']
+        return str(row['value'].values[0]) if not row.empty else None
+    
+    def update_relative_strength(self, batch):
+        """计算一批尚未提交的股票相对基准指数（及可选的行业指数）的强弱，写入日线指标"""
+        recent = self.recent_closes
+        entries = [(c, entry) for c, entry in batch.items() if c in recent and entry.get('indicators')]
+        if not entries:
+            return
+        closes = {c: recent[c] for c, _ in entries}
+        lookback = int(self.advice_params.rs_lookback)
+        try:
+            symbol = self.benchmark_symbol
+            benchmark = self.fetch_benchmark(
+                BenchmarkStore.index_key(symbol),
+                lambda start: self.ak.index_zh_a_hist(symbol=symbol, period="daily", start_date=start))
+            rs = relative_strength(closes, benchmark, lookback)
             
-            self.tree.insert("", tk.END, values=(code, name, price, change_pct, advice, accuracy, update_time))
+            rs_industry = np.full(len(entries), np.nan)
+            if self.industry_rs:
+                today = datetime.now().strftime("%Y%m%d")
+                groups = [self.benchmark_store.industry(c, self.lookup_industry) for c, _ in entries]
+                series = {}
+                for name in set(g for g in groups if g):
+                    series[name] = self.fetch_benchmark(
+                        BenchmarkStore.industry_key(name),
+                        lambda start, name=name: self.ak.stock_board_industry_hist_em(
+                            symbol=name, start_date=start, end_date=today, period="日k", adjust=""))
+                rs_industry = relative_strength(closes, series, lookback, groups)
+        except Exception as e:
+            print(f"计算相对强弱失败: {str(e)}")
+            return
+        
+        for i, (code, entry) in enumerate(entries):
+            entry['indicators'] = dict(entry['indicators'], rs=float(rs[i]), rs_industry=float(rs_industry[i]))
+    
+    def change_timeframe(self, event=None):
+        """切换列表中显示的建议周期"""
+        labels = {label: tf for tf, label in TIMEFRAME_LABELS.items()}
+        self.timeframe = labels.get(self.timeframe_box.get(), 'daily')
+        self.display_stocks()
+    
+    def calculate_timeframes(self, code, hist_data):
+        """由日线重采样出周线、月线并计算各自的技术指标"""
+        timeframes = {}
+        for timeframe in TIMEFRAMES:
+            if timeframe == 'daily':
+                continue
+            try:
+                bars = self.resampler.update(code, hist_data, timeframe)
+                if bars is None or bars.empty:
+                    continue
+                change_pct = bars['涨跌幅'].iloc[-1]
+                timeframes[timeframe] = {
+                    'indicators': self.calculate_technical_indicators(bars),
+                    'change_pct': float(change_pct) if pd.notna(change_pct) else None,
+                }
+            except Exception as e:
+                print(f"计算 {code} {TIMEFRAME_LABELS[timeframe]}指标失败: {str(e)}")
+        return timeframes
     
     def update_prices(self):
         """更新所有自选股票的价格"""
         if not self.watchlist:
             messagebox.showinfo("提示", "自选列表为空，请先添加股票")
             return
+        if self.refreshing:
+            return
         
         # 在新线程中更新，避免界面卡顿
+        self.refreshing = True
         threading.Thread(target=self._update_prices_thread, daemon=True).start()
         self.status_label.config(text="正在更新价格...", foreground="blue")
     
+    def auto_refresh(self):
+        """按设定间隔自动刷新"""
+        if self.watchlist and not self.refreshing:
+            self.update_prices()
+        elif self.refreshing:
+            self.refresh_skipped += 1
+        self.root.after(int(self.refresh_interval * 1000), self.auto_refresh)
+    
     def _update_prices_thread(self):
         """更新价格的线程函数"""
-        success_count = 0
-        for i, code in enumerate(self.watchlist):
-            if self.update_single_stock(code):
-                success_count += 1
-            # 添加延迟，避免请求过快导致连接被关闭
-            if i < len(self.watchlist) - 1:
-                time.sleep(0.5)  # 每次请求间隔0.5秒
+        try:
+            if self.profile_next_refresh:
+                self.profile_next_refresh = False
+                profile_call(self._refresh_all)
+            else:
+                self._refresh_all()
+        finally:
+            self.refreshing = False
+    
+    def post_ui(self, func):
+        """从后台线程把界面更新交给界面线程执行，并统计排队中的数量"""
+        with self._ui_lock:
+            self.ui_pending += 1
+        
+        def run():
+            try:
+                func()
+            finally:
+                with self._ui_lock:
+                    self.ui_pending -= 1
+        
+        self.root.after(0, run)
+    
+    def _refresh_all(self):
+        """刷新所有自选股票、评分、持仓并发布快照"""
+        try:
+            started = time.perf_counter()
+            # 本次刷新使用开始时的自选列表；刷新期间删除的股票在提交时被忽略
+            codes = self.state.current.watchlist
+            # 请求间隔由速率控制器统一调节
+            success_count = self.refresh_codes(codes)
+            
+            # 长时间运行时代码表跨日过期，用本次刷新取得的行情快照重建
+            if self.symbol_master.is_stale() and self.all_stocks_cache is not None:
+                try:
+                    self.refresh_symbol_master(self.all_stocks_cache)
+                except Exception as e:
+                    print(f"刷新股票代码表失败: {str(e)}")
+            
+            # 持仓盯市
+            metrics = self.rate_controller.metrics()
+            status = (f"更新完成！成功更新 {success_count}/{len(codes)} 只股票"
+                      f"（请求速率 {metrics['rate']:.1f}/秒，错误 {metrics['errors']} 次）")
+            if self.update_portfolio():
+                status += f"，持仓浮动盈亏 {self.portfolio_result['total_pnl']:.2f}"
+            
+            # 相关性与组合波动率
+            self.update_risk(codes)
+            
+            duration = time.perf_counter() - started
+            self.refresh_history.append({
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'duration': round(duration, 3),
+                'symbols': len(codes),
+                'success': success_count,
+            })
+            
+            self.publish_snapshot()
+            
+            # 更新完成后刷新显示
+            self.post_ui(self.display_stocks)
+            self.post_ui(self.refresh_portfolio_view)
+            self.post_ui(self.refresh_risk_view)
+            color = "green"
+        except Exception as e:
+            # 刷新失败时也要更新状态，不能停留在“正在更新价格...”
+            import traceback
+            print(f"刷新失败: {str(e)}")
+            print(f"错误详情: {traceback.format_exc()}")
+            status, color = f"更新失败: {str(e)}", "red"
+        self.post_ui(lambda: self.status_label.config(text=status, foreground=color))
+    
+    def publish_snapshot(self):
+        """把当前数据发布到HTTP接口（未启用接口时不做任何事）"""
+        if self.api_hub is None:
+            return
+        
+        def number(value):
+            if value is None:
+                return None
+            value = float(value)
+            return None if math.isnan(value) or math.isinf(value) else value
+        
+        # 只读取一次状态，发布的自选列表和股票数据总是同一版
+        state = self.state.current
+        stocks = {}
+        for code in state.watchlist:
+            data = state.stocks.get(code)
+            if data is None:
+                continue
+            advice = data.get('advice')
+            mask = data.get('mask', 0)
+            update_time = data.get('update_time')
+            stocks[code] = {
+                'name': data.get('name', code),
+                'price': number(data.get('price')),
+                'change_pct': number(data.get('change_pct')),
+                'indicators': {k: number(v) for k, v in (data.get('indicators') or {}).items()},
+                'score': number(data.get('score')),
+                'advice': advice,
+                'advice_text': format_advice(advice, mask) if advice is not None else None,
+                'indicators_used': indicator_names(mask),
+                'accuracy': number(data.get('accuracy')),
+                'quality': {key: quality_names(flags) for key, flags in (data.get('quality') or {}).items()},
+                'timeframes': {
+                    tf: {
+                        'change_pct': number(frame.get('change_pct')),
+                        'advice': data.get('results', {}).get(tf, {}).get('advice'),
+                        'accuracy': number(data.get('results', {}).get(tf, {}).get('accuracy')),
+                    }
+                    for tf, frame in (data.get('timeframes') or {}).items()
+                },
+                'update_time': update_time.isoformat(timespec='seconds') if update_time else None,
+            }
+        risk = {}
+        for window, summary in self.risk_summary.items():
+            risk[str(window)] = dict(summary,
+                                     equal_weight_volatility=number(summary.get('equal_weight_volatility')),
+                                     portfolio_volatility=number(summary.get('portfolio_volatility')))
+        refresh = {
+            'last': self.refresh_history[-1] if self.refresh_history else None,
+            'skipped': self.refresh_skipped,
+            'ui_pending': self.ui_pending,
+        }
+        self.api_hub.publish({'watchlist': list(state.watchlist), 'stocks': stocks,
+                              'upstream': self.rate_controller.metrics(), 'refresh': refresh, 'risk': risk,
+                              'screen': self.screen_watchlist(state)}, state_version=state.version)
+    
+    def screen_watchlist(self, state):
+        """按日线得分对自选股票选股（建议买入及以上，可要求相对强弱不低于 screen_min_rs）"""
+        codes = [code for code in state.watchlist
+                 if code in state.stocks and 'indicators' in state.stocks[code]
+                 and state.stocks[code].get('advice') != AdviceCode.BAD_DATA]
+        if not codes:
+            return []
+        entries = [state.stocks[code] for code in codes]
+        ind = stack_indicators([e['price'] for e in entries], [e['change_pct'] for e in entries],
+                               [e['indicators'] for e in entries])
+        result = []
+        for code, score, advice in screen(codes, ind, self.advice_params, min_advice=AdviceCode.BUY,
+                                          min_rs=self.screen_min_rs):
+            rs = (state.stocks[code]['indicators'] or {}).get('rs')
+            result.append({'code': code, 'name': state.stocks[code].get('name', code), 'score': score,
+                           'advice': advice, 'advice_text': ADVICE_LABELS[AdviceCode(advice)],
+                           'rs': rs if rs is not None and math.isfinite(rs) else None})
+        return result
+    
+    def export_history(self):
+        """把缓存的历史指标和建议增量导出为Parquet文件"""
+        try:
+            from indicator_export import IndicatorExporter
+            benchmark = self.benchmark_store.load(BenchmarkStore.index_key(self.benchmark_symbol))
+            exporter = IndicatorExporter("export", params=self.advice_params, quality_window=self.closes_depth(),
+                                         benchmark=benchmark)
+        except ImportError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        
+        def run():
+            try:
+                rows = exporter.export(self.history_store)
+                text, color = f"导出完成，新增 {rows} 行（export 目录）", "green"
+            except Exception as e:
+                text, color = f"导出失败: {str(e)}", "red"
+            self.root.after(0, lambda: self.status_label.config(text=text, foreground=color))
+        
+        threading.Thread(target=run, daemon=True).start()
+        self.status_label.config(text="正在导出...", foreground="blue")
+    
+    def update_portfolio(self):
+        """用最新行情快照对持仓盯市，并记录当日收益"""
+        if not self.portfolio.lots:
+            return False
+        result = self.portfolio.mark_to_market(self.get_all_stocks_data())
+        if result is None:
+            return False
+        self.portfolio_result = result
+        self.portfolio.record_daily(result)
+        self.portfolio.save()
+        return True
+    
+    def update_risk(self, codes):
+        """用本次刷新得到的日线增量更新风险矩阵，并计算各窗口的摘要"""
+        recent = self.recent_closes
+        closes = {code: recent[code] for code in codes if code in recent}
+        if len(closes) < 2:
+            self.risk_summary = {}
+            return False
+        try:
+            self.risk_model.update(closes)
+            weights = None
+            if self.portfolio_result is not None:
+                weights = dict(zip(self.portfolio_result['codes'], self.portfolio_result['market_value'].tolist()))
+            self.risk_summary = {w: self.risk_model.summary(w, weights) for w in self.risk_model.windows}
+            return True
+        except Exception as e:
+            print(f"更新风险矩阵失败: {str(e)}")
+            return False
+    
+    def show_risk(self):
+        """显示相关性与风险窗口"""
+        if self.risk_window is not None and self.risk_window.winfo_exists():
+            self.risk_window.lift()
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("相关性与风险")
+        window.geometry("700x500")
+        self.risk_window = window
+        
+        top_frame = ttk.Frame(window, padding="10")
+        top_frame.pack(fill=tk.X)
+        ttk.Label(top_frame, text="窗口(交易日):").pack(side=tk.LEFT, padx=5)
+        self.risk_window_box = ttk.Combobox(top_frame, width=6, state="readonly",
+                                            values=[str(w) for w in self.risk_model.windows])
+        self.risk_window_box.set(str(self.risk_model.windows[0]))
+        self.risk_window_box.pack(side=tk.LEFT, padx=5)
+        self.risk_window_box.bind('<<ComboboxSelected>>', lambda e: self.refresh_risk_view())
+        
+        # 高相关分组：中心股票为父行，组内股票为子行
+        columns = ("股票数", "平均相关", "年化波动率")
+        self.risk_tree = ttk.Treeview(window, columns=columns, height=10)
+        self.risk_tree.heading("#0", text="高相关分组 / 股票")
+        self.risk_tree.column("#0", width=220)
+        for col in columns:
+            self.risk_tree.heading(col, text=col)
+            self.risk_tree.column(col, width=120, anchor=tk.CENTER)
+        self.risk_tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        self.risk_pairs = ttk.Label(window, text="", padding="10", justify=tk.LEFT)
+        self.risk_pairs.pack(fill=tk.X)
+        self.risk_label = ttk.Label(window, text="", padding="10")
+        self.risk_label.pack(fill=tk.X)
+        
+        self.refresh_risk_view()
+    
+    def refresh_risk_view(self):
+        """刷新风险窗口显示"""
+        if self.risk_window is None or not self.risk_window.winfo_exists():
+            return
+        tree = self.risk_tree
+        for item in tree.get_children():
+            tree.delete(item)
+        
+        window = int(self.risk_window_box.get())
+        summary = self.risk_summary.get(window)
+        if summary is None:
+            self.risk_pairs.config(text="")
+            self.risk_label.config(text="点击\"更新价格\"后计算相关性（至少需要2只自选股票）")
+            return
+        
+        volatility = self.risk_model.volatility(window)
+        for i, group in enumerate(summary['clusters']):
+            parent = tree.insert("", tk.END, text=f"组{i + 1}: {self.format_code_name(group['center'])}", open=True,
+                                 values=(len(group['codes']), f"{group['avg_corr']:.2f}", ""))
+            for code in group['codes']:
+                tree.insert(parent, tk.END, text=self.format_code_name(code),
+                            values=("", "", f"{volatility[code] * 100:.1f}%" if pd.notna(volatility[code]) else "--"))
+        
+        pairs = "\n".join(f"{self.format_code_name(a)} - {self.format_code_name(b)}: {corr:.2f}"
+                          for a, b, corr in summary['top_pairs'][:5])
+        self.risk_pairs.config(text=f"相关性最高的股票对:\n{pairs}" if pairs else "")
+        
+        def percent(value):
+            return f"{value * 100:.1f}%" if value is not None else "--"
+        
+        text = (f"截至 {summary['as_of']}，{summary['symbols']} 只股票  "
+                f"自选等权组合年化波动率 {percent(summary['equal_weight_volatility'])}")
+        if 'portfolio_volatility' in summary:
+            text += (f"  持仓组合年化波动率 {percent(summary['portfolio_volatility'])}"
+                     f"（覆盖持仓市值 {summary['portfolio_coverage'] * 100:.0f}%）")
+        self.risk_label.config(text=text)
+    
+    def show_portfolio(self):
+        """显示持仓窗口"""
+        if self.portfolio_window is not None and self.portfolio_window.winfo_exists():
+            self.portfolio_window.lift()
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("持仓")
+        window.geometry("800x450")
+        self.portfolio_window = window
+        
+        # 新增批次
+        input_frame = ttk.Frame(window, padding="10")
+        input_frame.pack(fill=tk.X)
+        entries = {}
+        for label, width in [("代码", 10), ("数量", 10), ("成本价", 10)]:
+            ttk.Label(input_frame, text=f"{label}:").pack(side=tk.LEFT, padx=5)
+            entries[label] = ttk.Entry(input_frame, width=width)
+            entries[label].pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="添加持仓", command=lambda: self.add_lot(entries)).pack(side=tk.LEFT, padx=5)
+        
+        # 持仓列表：持仓为父行，批次为子行
+        columns = ("数量", "成本", "现价", "市值", "浮动盈亏", "当日盈亏")
+        self.portfolio_tree = ttk.Treeview(window, columns=columns, height=12)
+        self.portfolio_tree.heading("#0", text="代码 / 批次")
+        self.portfolio_tree.column("#0", width=160)
+        for col in columns:
+            self.portfolio_tree.heading(col, text=col)
+            self.portfolio_tree.column(col, width=100, anchor=tk.CENTER)
+        self.portfolio_tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        menu = tk.Menu(window, tearoff=0)
+        menu.add_command(label="删除", command=self.delete_lot)
+        self.portfolio_tree.bind("<Button-3>", lambda e: menu.post(e.x_root, e.y_root) if self.portfolio_tree.selection() else None)
         
-        # 更新完成后刷新显示
-        self.root.after(0, self.display_stocks)
-        self.root.after(0, lambda: self.status_label.config(
-            text=f"更新完成！成功更新 {success_count}/{len(self.watchlist)} 只股票", 
-            foreground="green"
-        ))
+        self.portfolio_summary = ttk.Label(window, text="", padding="10")
+        self.portfolio_summary.pack(fill=tk.X)
+        
+        self.refresh_portfolio_view()
+    
+    def add_lot(self, entries):
+        """从持仓窗口新增一个批次"""
+        code = self.resolve_input(entries["代码"].get().strip())
+        try:
+            quantity = float(entries["数量"].get())
+            cost = float(entries["成本价"].get())
+        except ValueError:
+            messagebox.showerror("错误", "数量和成本价必须是数字", parent=self.portfolio_window)
+            return
+        if not self.validate_stock_code(code):
+            messagebox.showerror("错误", f"股票代码 {code} 无效或不存在", parent=self.portfolio_window)
+            return
+        
+        self.portfolio.add_lot(code, quantity, cost)
+        self.portfolio.save()
+        for entry in entries.values():
+            entry.delete(0, tk.END)
+        self.portfolio_result = self.portfolio.mark_to_market(self.all_stocks_cache)
+        self.refresh_portfolio_view()
+    
+    def delete_lot(self):
+        """删除选中的批次（选中持仓行时删除该股票的所有批次）"""
+        selection = self.portfolio_tree.selection()
+        if not selection:
+            return
+        item = selection[0]
+        lot_ids = [item] if self.portfolio_tree.parent(item) else list(self.portfolio_tree.get_children(item))
+        if messagebox.askyesno("确认", "确定要删除选中的持仓吗？", parent=self.portfolio_window):
+            for lot_id in lot_ids:
+                self.portfolio.remove_lot(lot_id)
+            self.portfolio.save()
+            self.portfolio_result = self.portfolio.mark_to_market(self.all_stocks_cache)
+            self.refresh_portfolio_view()
+    
+    def refresh_portfolio_view(self):
+        """刷新持仓窗口显示"""
+        if self.portfolio_window is None or not self.portfolio_window.winfo_exists():
+            return
+        tree = self.portfolio_tree
+        for item in tree.get_children():
+            tree.delete(item)
+        
+        result = self.portfolio_result
+        if result is None:
+            # 尚未获取行情，仅显示成本
+            for lot in self.portfolio.lots:
+                parent = lot['code'] if tree.exists(lot['code']) else tree.insert(
+                    "", tk.END, iid=lot['code'], text=self.format_code_name(lot['code']), open=True)
+                tree.insert(parent, tk.END, iid=lot['id'], text=lot['date'],
+                            values=(f"{lot['quantity']:.0f}", f"{lot['quantity'] * lot['cost']:.2f}", "--", "--", "--", "--"))
+            self.portfolio_summary.config(text="点击\"更新价格\"后计算盈亏")
+            return
+        
+        for i, code in enumerate(result['codes']):
+            tree.insert("", tk.END, iid=code, text=self.format_code_name(code), open=True, values=(
+                f"{result['quantity'][i]:.0f}", f"{result['cost'][i]:.2f}", f"{result['price'][i]:.2f}",
+                f"{result['market_value'][i]:.2f}", f"{result['pnl'][i]:.2f}", f"{result['day_pnl'][i]:.2f}"))
+        for j, lot in enumerate(self.portfolio.lots):
+            if not tree.exists(lot['code']):
+                continue
+            tree.insert(lot['code'], tk.END, iid=lot['id'], text=lot['date'], values=(
+                f"{lot['quantity']:.0f}", f"{lot['quantity'] * lot['cost']:.2f}", "", "",
+                f"{result['lot_pnl'][j]:.2f}", ""))
+        
+        exposure = "  ".join(f"{board} {value:.0f}" for board, value in result['exposure'].items() if value)
+        self.portfolio_summary.config(text=(
+            f"总市值 {result['total_value']:.2f}  总成本 {result['total_cost']:.2f}  "
+            f"浮动盈亏 {result['total_pnl']:.2f}  当日盈亏 {result['total_day_pnl']:.2f} "
+            f"({result['day_return']:.2f}%)    板块敞口: {exposure}"))
+    
+    def format_code_name(self, code):
+        """格式化为"代码 名称"形式"""
+        return f"{code} {self.symbol_master.get_name(code, '')}".strip()
     
     def get_all_stocks_data(self):
         """获取所有股票数据（带缓存和重试机制）"""
         # 检查缓存是否有效
-        if self.all_stocks_cache is not None and self.cache_time is not None:
-            if time.time() - self.cache_time < self.cache_timeout:
-                return self.all_stocks_cache
+        state = self.state.current
+        if state.market is not None and state.market_time is not None:
+            if time.time() - state.market_time < self.cache_timeout:
+                return state.market
         
-        # 重试机制
+        # 重试机制（限速和退避由速率控制器处理）
         max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                stock_data = ak.stock_zh_a_spot_em()
-                # 缓存数据
-                self.all_stocks_cache = stock_data
-                self.cache_time = time.time()
-                return stock_data
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    print(f"获取股票数据失败，重试 {attempt + 1}/{max_retries}: {str(e)}")
-                    time.sleep(1)  # 等待1秒后重试
-                else:
-                    print(f"获取股票数据失败（已重试{max_retries}次）: {str(e)}")
-                    return None
-        return None
+        try:
+            stock_data = self.rate_controller.call(self.ak.stock_zh_a_spot_em, retries=max_retries)
+        except Exception as e:
+            print(f"获取股票数据失败（已重试{max_retries}次）: {str(e)}")
+            return None
+        # 缓存数据
+        fetched_at = time.time()
+        self.state.set_market(stock_data, fetched_at)
+        
+        # 记录与上一份快照相比变化的行
+        changed = self.snapshot_log.append(stock_data, fetched_at)
+        print(f"行情快照共 {len(stock_data)} 行，变化 {changed} 行")
+        return stock_data
     
-    def update_single_stock(self, code):
-        """更新单只股票的价格（带重试机制）"""
+    def update_single_stock(self, code, batch=None):
+        """更新单只股票的价格（带重试机制）；提供 batch 时数据写入 batch，由调用方统一提交"""
         max_retries = 2
         
         for attempt in range(max_retries):
@@ -283,88 +1013,24 @@ class StockTrader:
                         price = row['最新价']
                         change_pct = row['涨跌幅']
                         
-                        # 获取历史数据计算技术指标（尝试多个数据源）
-                        indicators = None
-                        hist_data = None
-                        
-                        # 方法1：尝试使用东方财富接口（带复权）
-                        if hist_data is None:
-                            try:
-                                hist_data = ak.stock_zh_a_hist(symbol=code, period="daily", adjust="qfq", start_date="20230101")
-                                if hist_data is not None and not hist_data.empty:
-                                    print(f"获取股票 {code} 历史数据成功（东方财富-前复权），共 {len(hist_data)} 条")
-                            except Exception as e:
-                                print(f"方法1失败（东方财富-前复权）: {str(e)}")
-                                hist_data = None
-                        
-                        # 方法2：尝试使用东方财富接口（不复权）
-                        if hist_data is None:
-                            try:
-                                hist_data = ak.stock_zh_a_hist(symbol=code, period="daily", adjust="", start_date="20230101")
-                                if hist_data is not None and not hist_data.empty:
-                                    print(f"获取股票 {code} 历史数据成功（东方财富-不复权），共 {len(hist_data)} 条")
-                            except Exception as e:
-                                print(f"方法2失败（东方财富-不复权）: {str(e)}")
-                                hist_data = None
-                        
-                        # 方法3：尝试使用东方财富接口（后复权）
-                        if hist_data is None:
-                            try:
-                                hist_data = ak.stock_zh_a_hist(symbol=code, period="daily", adjust="hfq", start_date="20230101")
-                                if hist_data is not None and not hist_data.empty:
-                                    print(f"获取股票 {code} 历史数据成功（东方财富-后复权），共 {len(hist_data)} 条")
-                            except Exception as e:
-                                print(f"方法3失败（东方财富-后复权）: {str(e)}")
-                                hist_data = None
-                        
-                        # 方法4：尝试使用更早的日期范围（可能数据更多）
-                        if hist_data is None:
-                            try:
-                                hist_data = ak.stock_zh_a_hist(symbol=code, period="daily", adjust="qfq", start_date="20220101")
-                                if hist_data is not None and not hist_data.empty:
-                                    print(f"获取股票 {code} 历史数据成功（扩展日期范围），共 {len(hist_data)} 条")
-                            except Exception as e:
-                                print(f"方法4失败（扩展日期范围）: {str(e)}")
-                                hist_data = None
-                        
-                        # 如果获取到数据，计算技术指标
-                        if hist_data is not None and not hist_data.empty:
-                            indicators = self.calculate_technical_indicators(hist_data)
-                        else:
+                        # 获取历史数据计算技术指标（不复权增量下载，本地前复权）
+                        hist_data = self.fetch_history(code)
+                        if hist_data is None or hist_data.empty:
                             print(f"所有数据源均失败，股票 {code} 无法获取历史数据")
                         
-                        # 生成交易建议和准确性
-                        advice, accuracy = self.generate_advice(price, change_pct, indicators)
-                        
-                        # 保存数据
-                        self.stock_data[code] = {
+                        # 保存数据（交易建议由 score_entries 批量计算）
+                        entry = {
                             'name': name,
-                            'price': f"{price:.2f}" if price else "--",
-                            'change_pct': f"{change_pct:.2f}" if change_pct is not None else "--",
-                            'advice': advice,
-                            'accuracy': f"{accuracy:.2f}",
-                            'update_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                            'price': float(price) if price is not None else None,
+                            'change_pct': float(change_pct) if change_pct is not None else None,
+                            'update_time': datetime.now()
                         }
+                        entry.update(self.analyze_history(code, hist_data))
+                        self._store_entry(code, batch, entry)
                         return True
                 
-                # 方法2：使用个股历史数据接口（备用，尝试多个数据源）
-                current_data = None
-                
-                # 尝试多个数据源获取历史数据
-                for method_name, params in [
-                    ("东方财富-前复权", {"period": "daily", "adjust": "qfq"}),
-                    ("东方财富-不复权", {"period": "daily", "adjust": ""}),
-                    ("东方财富-后复权", {"period": "daily", "adjust": "hfq"}),
-                ]:
-                    if current_data is None:
-                        try:
-                            current_data = ak.stock_zh_a_hist(symbol=code, start_date="20230101", **params)
-                            if current_data is not None and not current_data.empty:
-                                print(f"备用方法获取股票 {code} 历史数据成功（{method_name}），共 {len(current_data)} 条")
-                                break
-                        except Exception as e:
-                            print(f"备用方法失败（{method_name}）: {str(e)}")
-                            current_data = None
+                # 方法2：使用个股历史数据接口（备用）
+                current_data = self.fetch_history(code)
                 
                 if current_data is not None and not current_data.empty:
                     try:
@@ -388,19 +1054,21 @@ class StockTrader:
                         
                         price = float(close_price)
                         
-                        # 获取股票名称
-                        try:
-                            stock_detail = ak.stock_individual_info_em(symbol=code)
-                            if stock_detail is not None and not stock_detail.empty:
-                                name_row = stock_detail[stock_detail['item'] == '股票简称']
-                                if not name_row.empty:
-                                    name = name_row['value'].values[0]
+                        # 获取股票名称（优先查本地代码表）
+                        name = self.symbol_master.get_name(code)
+                        if name is None:
+                            try:
+                                stock_detail = self.rate_controller.call(self.ak.stock_individual_info_em, symbol=code)
+                                if stock_detail is not None and not stock_detail.empty:
+                                    name_row = stock_detail[stock_detail['item'] == '股票简称']
+                                    if not name_row.empty:
+                                        name = name_row['value'].values[0]
+                                    else:
+                                        name = code
                                 else:
                                     name = code
-                            else:
+                            except:
                                 name = code
-                        except:
-                            name = code
                         
                         # 计算涨跌幅（与前一交易日比较）
                         if len(current_data) > 1:
@@ -422,60 +1090,114 @@ class StockTrader:
                         else:
                             change_pct = 0.0
                         
-                        # 计算技术指标
-                        indicators = self.calculate_technical_indicators(current_data)
-                        
-                        # 生成交易建议和准确性
-                        advice, accuracy = self.generate_advice(price, change_pct, indicators)
-                        
-                        # 保存数据
-                        self.stock_data[code] = {
+                        # 保存数据并计算技术指标（交易建议由 score_entries 批量计算）
+                        entry = {
                             'name': name,
-                            'price': f"{price:.2f}" if price else "--",
-                            'change_pct': f"{change_pct:.2f}" if change_pct is not None else "--",
-                            'advice': advice,
-                            'accuracy': f"{accuracy:.2f}",
-                            'update_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                            'price': float(price) if price is not None else None,
+                            'change_pct': float(change_pct) if change_pct is not None else None,
+                            'update_time': datetime.now()
                         }
+                        entry.update(self.analyze_history(code, current_data))
+                        self._store_entry(code, batch, entry)
                         return True
                     except Exception as e:
                         print(f"处理历史数据失败: {str(e)}")
                         import traceback
                         traceback.print_exc()
                 
-                # 如果所有方法都失败，继续重试
+                # 如果所有方法都失败，退避后重试
                 if attempt < max_retries - 1:
-                    time.sleep(0.5)
+                    self.rate_controller.sleep_backoff(attempt)
                     continue
                 else:
                     print(f"备用方法获取股票 {code} 失败")
-                
-                # 如果两种方法都失败
-                if attempt < max_retries - 1:
-                    time.sleep(0.5)
-                    continue
-                else:
                     raise Exception("所有方法都失败")
                     
             except Exception as e:
                 if attempt < max_retries - 1:
                     print(f"更新股票 {code} 失败，重试 {attempt + 1}/{max_retries}: {str(e)}")
-                    time.sleep(1)  # 等待后重试
+                    self.rate_controller.sleep_backoff(attempt)  # 退避后重试
                 else:
                     # 最终失败，保存错误信息
-                    self.stock_data[code] = {
+                    self._store_entry(code, batch, {
                         'name': code,
-                        'price': '--',
-                        'change_pct': '--',
-                        'advice': '数据获取失败',
-                        'accuracy': '--',
-                        'update_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
+                        'price': None,
+                        'change_pct': None,
+                        'advice': AdviceCode.FETCH_FAILED,
+                        'update_time': datetime.now()
+                    })
                     print(f"更新股票 {code} 失败（已重试{max_retries}次）: {str(e)}")
                     return False
         
         return False
     
+    def analyze_history(self, code, hist_data):
+        """
+        检查历史数据质量并计算指标，返回要写入股票数据的字段
+        未通过检查时不计算指标（不参与评分、相对强弱和风险矩阵），建议显示为数据异常
+        """
+        if hist_data is None or hist_data.empty:
+            self.set_recent_closes(code, None)
+            return {'indicators': None, 'timeframes': {}}
+        
+        record = self.symbol_master.get(code) or {}
+        report = self.quality_gate.check(code, hist_data, record.get('board') or get_exchange_board(code)[1],
+                                         record.get('listing_date'))
+        quality = {'flags': report.flags, 'blocking': report.blocking}
+        if not report.ok:
+            print(f"股票 {code} 历史数据未通过质量检查，不参与评分: {report.counts}")
+            self.set_recent_closes(code, None)
+            return {'indicators': None, 'timeframes': {}, 'quality': quality,
+                    'advice': AdviceCode.BAD_DATA, 'mask': 0}
+        
+        hist_data = report.clean(hist_data)
+        self.set_recent_closes(code, close_tail(hist_data, self.closes_depth()))
+        return {
+            'indicators': self.calculate_technical_indicators(hist_data),
+            'timeframes': self.calculate_timeframes(code, hist_data),
+            'quality': quality,
+        }
+    
+    def set_recent_closes(self, code, closes):
+        """替换一只股票的最近收盘价（None 表示删除）：复制出新字典后整体替换，不修改读取方持有的字典"""
+        with self._closes_lock:
+            recent = dict(self.recent_closes)
+            if closes is None:
+                recent.pop(code, None)
+            else:
+                recent[code] = closes
+            self.recent_closes = recent
+    
+    def _store_entry(self, code, batch, entry):
+        """把一只股票的数据写入批次，没有批次时直接提交到共享状态"""
+        if batch is None:
+            self.state.put_stocks({code: entry})
+        else:
+            batch[code] = entry
+    
+    def fetch_history(self, code):
+        """获取前复权日线：增量下载不复权数据并合并到本地缓存，复权在本地推导"""
+        # 本地缓存只读取一次，用于确定增量下载的起始日期、合并新数据和下载失败时回退
+        raw = self.history_store.load_raw(code)
+        start_date = self.history_store.last_date(code, raw) or "20230101"
+        new_data = None
+        try:
+            new_data = self.rate_controller.call(self.ak.stock_zh_a_hist, symbol=code, period="daily", adjust="",
+                                                 start_date=start_date, retries=2)
+        except Exception as e:
+            print(f"获取股票 {code} 历史数据失败（东方财富-不复权）: {str(e)}")
+        
+        if new_data is not None and not new_data.empty:
+            merged, factors = self.history_store.append_raw(code, new_data, raw)
+            print(f"获取股票 {code} 历史数据成功（东方财富-不复权，下载 {len(new_data)} 条），共 {len(merged)} 条")
+            return apply_factors(merged, factors, "qfq")
+        
+        # 下载失败时使用本地缓存
+        if raw is None or raw.empty:
+            return None
+        print(f"使用股票 {code} 本地历史缓存，共 {len(raw)} 条")
+        return apply_factors(raw, self.history_store.load_factors(code), "qfq")
+    
     def calculate_technical_indicators(self, hist_data):
         """计算技术指标"""
         if hist_data is None or hist_data.empty:
@@ -521,19 +1243,21 @@ class StockTrader:
             if date_col:
                 hist_data = hist_data.sort_values(date_col)
             
-            # 获取收盘价数据
-            closes = pd.to_numeric(hist_data[close_col], errors='coerce').dropna().values
+            # 获取收盘价数据，只保留有收盘价的行
+            closes = pd.to_numeric(hist_data[close_col], errors='coerce').values
+            valid = ~np.isnan(closes)
+            closes = closes[valid]
             
             if len(closes) < 5:
                 print(f"技术指标计算失败: 有效收盘价数据不足（只有{len(closes)}条）")
                 return None
             
-            # 获取成交量数据（可选）
+            # 获取成交量数据（可选），与收盘价取相同的行，保持逐日对齐
             volumes = None
             if volume_col:
                 try:
-                    volumes = pd.to_numeric(hist_data[volume_col], errors='coerce').dropna().values
-                    if len(volumes) == 0:
+                    volumes = pd.to_numeric(hist_data[volume_col], errors='coerce').values[valid]
+                    if np.isnan(volumes).all():
                         volumes = None
                 except:
                     volumes = None
@@ -572,8 +1296,8 @@ class StockTrader:
             
             # 4. 成交量变化率
             if volumes is not None and len(volumes) >= 5:
-                avg_volume_5 = np.mean(volumes[-5:])
-                avg_volume_20 = np.mean(volumes[-20:]) if len(volumes) >= 20 else avg_volume_5
+                avg_volume_5 = np.nanmean(volumes[-5:])
+                avg_volume_20 = np.nanmean(volumes[-20:]) if len(volumes) >= 20 else avg_volume_5
                 if avg_volume_20 > 0:
                     indicators['volume_ratio'] = float(avg_volume_5 / avg_volume_20)
                 else:
@@ -619,232 +1343,44 @@ class StockTrader:
             print(f"错误详情: {traceback.format_exc()}")
             return None
     
-    def calculate_accuracy(self, score, indicators_used, change_pct, indicators=None):
-        """计算预测准确性（基于指标数量、一致性和信号强度）"""
-        if indicators is None or len(indicators_used) == 0:
-            # 如果没有技术指标，准确性较低
-            return 35.0  # 仅基于涨跌幅，准确性约35%
-        
-        # 基础准确性：基于使用的指标数量
-        base_accuracy = 50.0  # 基础50%
-        indicator_count = len(indicators_used)
-        
-        # 每增加一个指标，提高5-8%的准确性
-        if indicator_count >= 5:
-            base_accuracy += 30.0
-        elif indicator_count >= 4:
-            base_accuracy += 20.0
-        elif indicator_count >= 3:
-            base_accuracy += 12.0
-        elif indicator_count >= 2:
-            base_accuracy += 6.0
-        
-        # 信号强度：基于得分绝对值
-        score_abs = abs(score)
-        if score_abs >= 4:
-            strength_bonus = 15.0  # 强烈信号
-        elif score_abs >= 2:
-            strength_bonus = 10.0  # 明确信号
-        elif score_abs >= 0.5:
-            strength_bonus = 5.0   # 弱信号
-        else:
-            strength_bonus = 0.0   # 中性信号
-        
-        # 指标一致性：检查各指标是否指向同一方向
-        consistency_bonus = 0.0
-        if indicators:
-            buy_signals = 0
-            sell_signals = 0
-            
-            # RSI信号
-            if 'rsi' in indicators:
-                rsi = indicators['rsi']
-                if rsi < 40:
-                    buy_signals += 1
-                elif rsi > 60:
-                    sell_signals += 1
-            
-            # 均线信号
-            if 'ma5' in indicators and 'ma20' in indicators:
-                ma5 = indicators['ma5']
-                ma20 = indicators['ma20']
-                if ma5 > ma20:
-                    buy_signals += 1
-                else:
-                    sell_signals += 1
-            
-            # MACD信号
-            if 'macd' in indicators and 'macd_signal' in indicators:
-                macd = indicators['macd']
-                signal = indicators['macd_signal']
-                if macd > signal and macd > 0:
-                    buy_signals += 1
-                elif macd < signal and macd < 0:
-                    sell_signals += 1
-            
-            # 趋势信号
-            if 'price_trend' in indicators:
-                trend = indicators['price_trend']
-                if trend > 0:
-                    buy_signals += 1
-                elif trend < 0:
-                    sell_signals += 1
-            
-            # 如果信号一致（都指向买入或都指向卖出），增加准确性
-            total_signals = buy_signals + sell_signals
-            if total_signals > 0:
-                consistency = max(buy_signals, sell_signals) / total_signals
-                consistency_bonus = consistency * 10.0  # 最高10%加成
-        
-        # 计算最终准确性
-        accuracy = base_accuracy + strength_bonus + consistency_bonus
-        
-        # 限制在合理范围内（35%-95%）
-        accuracy = max(35.0, min(95.0, accuracy))
-        
-        return round(accuracy, 2)  # 精确到百分之一
-    
-    def generate_advice(self, price, change_pct, indicators=None):
-        """根据价格、涨跌幅和技术指标生成交易建议，返回(建议, 准确性)"""
-        if price is None or price == 0:
-            return ("数据不足", 0.0)
-        
-        if change_pct is None:
-            return ("继续观望", 35.0)
-        
-        # 标记是否使用了技术指标
-        use_indicators = indicators is not None
-        
-        # 如果没有技术指标，使用简单逻辑
-        if not use_indicators:
-            if change_pct > 5:
-                return ("建议卖出 (仅涨跌幅)", 35.0)
-            elif change_pct > 2:
-                return ("谨慎持有 (仅涨跌幅)", 35.0)
-            elif change_pct > -2:
-                return ("继续持有 (仅涨跌幅)", 35.0)
-            elif change_pct > -5:
-                return ("可以考虑买入 (仅涨跌幅)", 35.0)
-            else:
-                return ("建议买入 (仅涨跌幅)", 35.0)
-        
-        # 综合多个指标进行判断
-        score = 0  # 正分表示买入信号，负分表示卖出信号
-        indicators_used = []  # 记录使用了哪些指标
-        
-        # 1. 涨跌幅权重 (30%)
-        if change_pct > 5:
-            score -= 3
-        elif change_pct > 2:
-            score -= 1
-        elif change_pct < -5:
-            score += 3
-        elif change_pct < -2:
-            score += 1
-        
-        # 2. RSI指标权重 (25%)
-        if 'rsi' in indicators:
-            indicators_used.append("RSI")
-            rsi = indicators['rsi']
-            if rsi > 70:  # 超买
-                score -= 2.5
-            elif rsi > 60:
-                score -= 1
-            elif rsi < 30:  # 超卖
-                score += 2.5
-            elif rsi < 40:
-                score += 1
-        
-        # 3. 均线系统权重 (20%)
-        if 'ma5' in indicators and 'ma20' in indicators:
-            indicators_used.append("MA")
-            ma5 = indicators['ma5']
-            ma20 = indicators['ma20']
-            current_price = price
-            
-            if current_price > ma5 > ma20:  # 多头排列
-                score += 2
-            elif current_price < ma5 < ma20:  # 空头排列
-                score -= 2
-            elif ma5 > ma20:  # 短期均线在长期均线上方
-                score += 1
-            else:
-                score -= 1
-        
-        # 4. MACD指标权重 (15%)
-        if 'macd' in indicators and 'macd_signal' in indicators:
-            indicators_used.append("MACD")
-            macd = indicators['macd']
-            signal = indicators['macd_signal']
-            if macd > signal and macd > 0:  # 金叉且MACD为正
-                score += 1.5
-            elif macd < signal and macd < 0:  # 死叉且MACD为负
-                score -= 1.5
-        
-        # 5. 成交量权重 (10%)
-        if 'volume_ratio' in indicators:
-            indicators_used.append("成交量")
-            volume_ratio = indicators['volume_ratio']
-            if volume_ratio > 1.5:  # 成交量放大
-                if change_pct > 0:
-                    score += 1  # 价涨量增
-                else:
-                    score -= 0.5  # 价跌量增
-            elif volume_ratio < 0.7:  # 成交量萎缩
-                score -= 0.5
-        
-        # 6. 价格趋势权重 (10%)
-        if 'price_trend' in indicators:
-            indicators_used.append("趋势")
-            trend = indicators['price_trend']
-            if trend > 5:  # 强势上涨趋势
-                score += 1
-            elif trend < -5:  # 强势下跌趋势
-                score -= 1
-        
-        # 计算预测准确性
-        accuracy = self.calculate_accuracy(score, indicators_used, change_pct, indicators)
-        
-        # 根据综合得分给出建议
-        if len(indicators_used) == 0:
-            # 如果技术指标都不可用，回退到简单逻辑
-            if change_pct > 5:
-                return ("建议卖出 (仅涨跌幅)", 35.0)
-            elif change_pct > 2:
-                return ("谨慎持有 (仅涨跌幅)", 35.0)
-            elif change_pct > -2:
-                return ("继续持有 (仅涨跌幅)", 35.0)
-            elif change_pct > -5:
-                return ("可以考虑买入 (仅涨跌幅)", 35.0)
-            else:
-                return ("建议买入 (仅涨跌幅)", 35.0)
-        
-        # 生成建议文本，包含使用的指标信息
-        indicator_info = f"({', '.join(indicators_used)})"
-        
-        if score >= 4:
-            return (f"强烈建议买入 {indicator_info}", accuracy)
-        elif score >= 2:
-            return (f"建议买入 {indicator_info}", accuracy)
-        elif score >= 0.5:
-            return (f"可以考虑买入 {indicator_info}", accuracy)
-        elif score >= -0.5:
-            return (f"继续持有 {indicator_info}", accuracy)
-        elif score >= -2:
-            return (f"谨慎持有 {indicator_info}", accuracy)
-        elif score >= -4:
-            return (f"建议卖出 {indicator_info}", accuracy)
-        else:
-            return (f"强烈建议卖出 {indicator_info}", accuracy)
-    
     def run(self):
         """运行程序"""
         self.root.mainloop()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="股票交易助手")
+    parser.add_argument('--serve', action='store_true', help="启动本地HTTP/JSON接口")
+    parser.add_argument('--host', default="127.0.0.1", help="HTTP接口监听地址")
+    parser.add_argument('--port', type=int, default=8765, help="HTTP接口端口")
+    parser.add_argument('--refresh-interval', type=float, default=None,
+                        help="自动刷新间隔（秒），启用HTTP接口时默认60秒")
+    parser.add_argument('--profile', action='store_true',
+                        help="对下一次刷新做性能分析，结果保存到 profiles 目录（也可设置环境变量 STOCK_TRADER_PROFILE=1）")
+    parser.add_argument('--risk-windows', default="20,60",
+                        help="相关性与波动率的滚动窗口（交易日，逗号分隔），默认 20,60")
+    parser.add_argument('--benchmark', default="000300",
+                        help="相对强弱的基准指数代码，默认000300（" + "、".join(
+                            f"{code} {name}" for code, name in BENCHMARKS.items()) + "）")
+    parser.add_argument('--industry-rs', action='store_true', help="同时计算相对所属行业指数的强弱")
+    parser.add_argument('--screen-min-rs', type=float, default=None,
+                        help="HTTP接口选股结果（/api/screen）要求的最低相对强弱（%%），默认不限制")
+    args = parser.parse_args()
+    risk_windows = [int(w) for w in args.risk_windows.split(',') if w.strip()]
+    
+    refresh_interval = args.refresh_interval
+    if args.serve and refresh_interval is None:
+        refresh_interval = 60
+    
     root = tk.Tk()
-    app = StockTrader(root)
+    app = StockTrader(root, api_port=args.port if args.serve else None, api_host=args.host,
+                      refresh_interval=refresh_interval, profile=args.profile or profiling_requested(),
+                      risk_windows=risk_windows, benchmark=args.benchmark, industry_rs=args.industry_rs,
+                      screen_min_rs=args.screen_min_rs)
+    
+    # 测量冷启动时间用（build_slim.py）：界面创建完成后立即退出
+    if os.environ.get("STOCK_TRADER_STARTUP_PROBE"):
+        root.after(0, root.destroy)
     app.run()
 
 
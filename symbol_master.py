@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地股票代码表
+保存代码、名称、交易所、板块、上市日期，由全市场实时行情快照构建并按日刷新，
+用于添加股票时的本地校验、名称查询以及代码/名称/拼音首字母前缀搜索
+"""
+
+import json
+import os
+import re
+from bisect import bisect_left
+from datetime import datetime
+
+from atomic_file import atomic_write_json
+
+# 拼音首字母为可选依赖，未安装时只支持代码和名称搜索
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    lazy_pinyin = None
+
+
+def get_exchange_board(code):
+    """根据代码前缀判断交易所和板块，返回(交易所, 板块)"""
+    if code.startswith(('688', '689')):
+        return ('SH', '科创板')
+    if code.startswith('6'):
+        return ('SH', '主板')
+    if code.startswith('30'):
+        return ('SZ', '创业板')
+    if code.startswith('00'):
+        return ('SZ', '主板')
+    if code.startswith(('8', '4', '92')):
+        return ('BJ', '北交所')
+    return ('', '')
+
+
+def get_initials(name):
+    """获取名称的拼音首字母（大写），只保留字母和数字"""
+    if lazy_pinyin is not None:
+        text = ''.join(lazy_pinyin(name, style=Style.FIRST_LETTER))
+    else:
+        text = name
+    return re.sub(r'[^0-9A-Za-z]', '', text).upper()
+
+
+class SymbolMaster:
+    """本地股票代码表，代码查询为O(1)，前缀搜索为O(log n)"""
+
+    def __init__(self, path="symbol_master.json"):
+        self.path = path
+        self.build_date = None
+        self.records = {}  # 代码 -> {name, exchange, board, listing_date, initials}
+        self._codes = []  # 排序后的代码
+        self._names = []  # 排序后的(名称, 代码)
+        self._initials = []  # 排序后的(拼音首字母, 代码)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, code):
+        return code in self.records
+
+    def load(self):
+        """从JSON文件加载代码表"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.build_date = data.get('build_date')
+            self.records = data.get('records', {})
+            self._rebuild_index()
+            return True
+        except Exception as e:
+            print(f"加载股票代码表失败: {str(e)}")
+            return False
+
+    def save(self):
+        """保存代码表到JSON文件"""
+        try:
+            atomic_write_json(self.path, {'build_date': self.build_date, 'records': self.records}, indent=None)
+        except Exception as e:
+            print(f"保存股票代码表失败: {str(e)}")
+
+    def is_stale(self):
+        """代码表是否需要刷新（每个自然日刷新一次）"""
+        return not self.records or self.build_date != datetime.now().strftime("%Y-%m-%d")
+
+    def build_from_snapshot(self, snapshot):
+        """由全市场实时行情快照（stock_zh_a_spot_em）构建代码表"""
+        if snapshot is None or snapshot.empty:
+            return False
+        codes = snapshot['代码'].astype(str).str.zfill(6).tolist()
+        names = snapshot['名称'].astype(str).tolist()
+        records = {}
+        for code, name in zip(codes, names):
+            old = self.records.get(code, {})
+            exchange, board = get_exchange_board(code)
+            # 名称未变化时沿用旧的拼音首字母，避免重复计算
+            if old.get('name') == name and 'initials' in old:
+                initials = old['initials']
+            else:
+                initials = get_initials(name)
+            records[code] = {
+                'name': name,
+                'exchange': exchange,
+                'board': board,
+                'listing_date': old.get('listing_date', ''),
+                'initials': initials,
+            }
+        self.records = records
+        self.build_date = datetime.now().strftime("%Y-%m-%d")
+        self._rebuild_index()
+        return True
+
+    def update_listing_dates(self, table):
+        """从交易所证券列表（含上市日期）补充上市日期，返回更新条数"""
+        if table is None or table.empty:
+            return 0
+        code_col = next((c for c in table.columns if '代码' in str(c)), None)
+        date_col = next((c for c in table.columns if '上市日期' in str(c)), None)
+        if code_col is None or date_col is None:
+            return 0
+        count = 0
+        for code, date in zip(table[code_col].astype(str).str.zfill(6), table[date_col].astype(str)):
+            if code in self.records and date and date != 'nan':
+                self.records[code]['listing_date'] = date[:10]
+                count += 1
+        return count
+
+    def _rebuild_index(self):
+        """重建排序索引"""
+        self._codes = sorted(self.records)
+        self._names = sorted((r['name'], c) for c, r in self.records.items())
+        self._initials = sorted((r.get('initials', ''), c) for c, r in self.records.items())
+
+    def get(self, code):
+        """获取代码对应的记录"""
+        return self.records.get(code)
+
+    def get_name(self, code, default=None):
+        """获取股票名称"""
+        record = self.records.get(code)
+        return record['name'] if record else default
+
+    def search(self, text, limit=10):
+        """按代码、名称或拼音首字母前缀搜索，返回代码列表"""
+        text = text.strip()
+        if not text or not self.records:
+            return []
+        if text.isdigit():
+            i = bisect_left(self._codes, text)
+            result = []
+            while i < len(self._codes) and len(result) < limit and self._codes[i].startswith(text):
+                result.append(self._codes[i])
+                i += 1
+            return result
+        if text.isascii():
+            return self._prefix_search(self._initials, text.upper(), limit)
+        return self._prefix_search(self._names, text, limit)
+
+    def _prefix_search(self, index, prefix, limit):
+        """在排序的(键, 代码)列表中做前缀搜索"""
+        i = bisect_left(index, (prefix, ''))
+        result = []
+        while i < len(index) and len(result) < limit and index[i][0].startswith(prefix):
+            result.append(index[i][1])
+            i += 1
+        return result